@@ -1,7 +1,6 @@
-from queue import Queue
-from threading import Condition, Lock, Semaphore, Thread
-from time import sleep
+from functools import partial
 
+from kivy.clock import Clock
 from kivy.graphics.context_instructions import Color
 from kivy.graphics.vertex_instructions import Line, Rectangle
 from kivy.metrics import dp, sp
@@ -13,9 +12,8 @@ from kivy.utils import get_color_from_hex
 from kivymd.color_definitions import colors
 from kivymd.uix.button import MDFlatButton
 
-from microprocessor_simulator import RAM
-from utils import (ASCII_TABLE, EVENTS, HEX_KEYBOARD, convert_to_hex,
-                   hex_to_binary)
+from io_bus import KeyboardInput
+from utils import ASCII_TABLE, EVENTS, HEX_KEYBOARD, convert_to_binary
 
 
 class ASCIIGrid(GridLayout):
@@ -49,12 +47,19 @@ class ASCIIGrid(GridLayout):
             }
         for label in self.labels:
             self.add_widget(label)
+        # Last byte shown by each label. Setting a label's text renders a new texture, even for the same text.
+        self.values = [None] * len(self.labels)
 
-    def update_ascii_grid(self):
-        i = 0
-        while i < len(self.labels):
-            self.labels[i].text = chr(int(RAM[int(ASCII_TABLE["port"], 16) + i], 16))
-            i += 1
+    def port_written(self, address, value):
+        """
+        Updates the character of the port written, see IOBus
+        :param address: int
+        :param value: int
+        """
+        index = address - int(ASCII_TABLE['port'], 16)
+        if self.values[index] != value:
+            self.values[index] = value
+            self.labels[index].text = chr(value)
 
 
 class HexKeyboard(GridLayout):
@@ -62,13 +67,11 @@ class HexKeyboard(GridLayout):
 
     def __init__(self, **kwargs):
         self.mem_table = kwargs.pop('mem_table')
+        micro_sim = kwargs.pop('micro_sim')
         self.dpi = kwargs.pop('dpi')
         super(HexKeyboard, self).__init__(**kwargs)
-        self.can_write = True
-        self.queue = Queue(maxsize=10)
-        self.lock = Lock()
-        self.semaphore = Semaphore()
-        self.condition = Condition()
+        # Writes the keys pressed to the port, RunWindow.attach_devices keeps its port current
+        self.input = KeyboardInput(micro_sim.write_memory, int(HEX_KEYBOARD['port'], 16), on_write=self.key_written)
         if self.dpi < 192:
             self.size_hint = (dp(0.4), dp(0.4))
             self.pos_hint = {
@@ -128,40 +131,26 @@ class HexKeyboard(GridLayout):
 
     def hex_key_press(self, instance):
         """
-        On hex keyboard press, a thread verifies if RAM is ready to be written.
-        Uses a shared queue to enqueue pressed keys that are to be written to RAM.
+        Queues the key pressed to be written to the port. Its digit goes in the high nibble.
         :param instance: obj
         """
-        thread = Thread(target=self.is_ram_ready)
-        if not self.queue.full():
-            self.queue.put(hex_to_binary(instance.text))
-            thread.start()
+        self.input.press(int(instance.text, 16) << 4)
 
-    def is_ram_ready(self):
+    def key_written(self, address, value):
         """
-        Utilizes semaphores and monitors to prevent threads from writing to RAM at the same time.
-        Current thread is allowed to write to RAM if the LSB is 0, otherwise it must wait.
+        Called on the KeyboardInput thread after a key is written, updates the memory table on the main thread
+        :param address: int
+        :param value: int
         """
-        with self.semaphore:
-            if self.can_write:
-                self.condition.acquire()
-            self.write_ram()
+        Clock.schedule_once(partial(self.update_port, address))
 
-    def write_ram(self):
+    def update_port(self, address, dt):
         """
-        Writes hex keyboard input to RAM.
-        Hex input is queued until RAM is ready to receive data
+        Shows the key written in the memory table
+        :param address: int
+        :param dt: float
         """
-
-        with self.lock:
-            self.can_write = False
-            RAM[int(HEX_KEYBOARD['port'], 16)] = convert_to_hex(
-                int(f'{self.queue.get()}0000', 2), 8)
-            self.mem_table.data_list.clear()
-            self.mem_table.get_data()
-            sleep(1)
-            self.can_write = True
-            self.condition.release()
+        self.mem_table.update_data([address])
         EVENTS['IS_RAM_EMPTY'] = False
 
 
@@ -195,6 +184,7 @@ class SevenSegmentDisplay(Widget):
     def __init__(self, **kwargs):
         super(SevenSegmentDisplay, self).__init__(**kwargs)
         self.border_color = get_color_from_hex(colors["Blue"]["500"])
+        self.digits = [None, None]  # Last byte shown by the left and right digits, picked by the control bit
 
     def activate_segments(self, binary):
         """
@@ -216,10 +206,21 @@ class SevenSegmentDisplay(Widget):
                 else:
                     self.right_display[i] = (1, 0, 0)
 
+    def port_written(self, address, value):
+        """
+        Activates the segments of the byte written to the port, see IOBus
+        :param address: int
+        :param value: int
+        """
+        if self.digits[value & 1] != value:
+            self.digits[value & 1] = value
+            self.activate_segments(convert_to_binary(value, 8))
+
     def clear_seven_segment(self):
         """
         Resets seven segment display to initial state.
         """
+        self.digits = [None, None]
         for i in range(len(self.left_display)):
             self.left_display[i] = (.41, .41, .41)
             self.right_display[i] = (.41, .41, .41)
@@ -245,6 +246,7 @@ class TrafficLights(Widget):
 
         # Index of last bits of the byte used as Input for traffic lights
         self.binary = ''  # variable needed for intermittent function
+        self.value = None  # Last byte shown
         self.border_color = get_color_from_hex(colors["Blue"]["500"])
 
     # Scheduler calls method to turn off all lights
@@ -299,3 +301,13 @@ class TrafficLights(Widget):
                 self.lights[i] = (1, 1, 0)
             elif i == 2 or i == 5:
                 self.lights[i] = (0, 1, 0)
+
+    def port_written(self, address, value):
+        """
+        Shows the byte written to the port, see IOBus
+        :param address: int
+        :param value: int
+        """
+        if self.value != value:
+            self.value = value
+            self.change_color(convert_to_binary(value, 8))
@@ -1,15 +1,14 @@
 import ntpath
 import os
-import time
+from collections import deque
 from pathlib import Path
 import traceback
 
 from kivy.app import App
 from kivy.clock import Clock
-from kivy.graphics.context_instructions import Color
-from kivy.graphics.vertex_instructions import Line
+from kivy.factory import Factory
 from kivy.metrics import MetricsBase, dp, sp
-from kivy.properties import ListProperty
+from kivy.properties import ListProperty, NumericProperty
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.codeinput import CodeInput
 from kivy.uix.floatlayout import FloatLayout
@@ -30,14 +29,16 @@ from kivymd.uix.navigationdrawer import (MDNavigationDrawer, MDToolbar,
 
 from GUI.IO.devices import (ASCIIGrid, HexKeyboard, SevenSegmentDisplay,
                             TrafficLights)
-from assembler import (Assembler, hexify_ram_content,
-                       verify_ram_content)
+from assembler import Assembler
+from history import InstructionHistory
+from io_bus import CoalescingScheduler
 from lexer import SemrefLexer
-from microprocessor_simulator import MicroSim
+from microprocessor_simulator import ERROR, HALT, STOPPED, MicroSim, disassemble
 from utils import (ASCII_TABLE, EVENTS, HEX_KEYBOARD, REGISTER,
                    SEVEN_SEGMENT_DISPLAY, TRAFFIC_LIGHT, is_valid_port,
-                   update_indicators, update_reserved_ports, RAM, seven_segment_binary,
-                   traffic_lights_binary, clear_ram, convert_to_hex)
+                   update_indicators, update_reserved_ports, RAM, RAM_HEX, HexView, clear_ram, convert_to_hex,
+                   device_ports)
+from worker import MAX_CLOCK_RATE, MIN_CLOCK_RATE, FrameRunner, SimulationWorker
 
 
 class RunWindow(FloatLayout):
@@ -54,12 +55,12 @@ class RunWindow(FloatLayout):
         self.light = TrafficLights()
         self.editor = TextEditor(dpi=self.dpi)
         self.seven_segment_display = SevenSegmentDisplay()
+        self.device_scheduler = CoalescingScheduler()  # Port writes waiting for flush_devices
 
         self.reg_table.get_data()
         self.mem_table.data_list.clear()
         self.mem_table.get_data()
-        self.inst_table.get_data(self.micro_sim.program_counter,
-                                 self.micro_sim.disassembled_instruction())
+        self.inst_table.clear_data()
         self.hex_keyboard_label = Label(text='HEX KEYBOARD',
                                         font_size=sp(20),
                                         color=(0, 0, 0, 1))
@@ -82,7 +83,9 @@ class RunWindow(FloatLayout):
         self.blinking_off.cancel()
 
         self.hex_keyboard_layout = HexKeyboard(mem_table=self.mem_table,
+                                               micro_sim=self.micro_sim,
                                                dpi=self.dpi)
+        self.attach_devices()
         box = FloatLayout()
         box.add_widget(self.hex_keyboard_layout)
         box.add_widget(self.hex_keyboard_label)
@@ -135,14 +138,42 @@ class RunWindow(FloatLayout):
         """
         self.popup.open()
 
+    def attach_devices(self):
+        """
+        Maps the output device ports to their widgets in the simulator's I/O bus, so each device is
+        refreshed when the simulator writes its port. The simulator may run on a SimulationWorker thread,
+        so writes are collected and applied to the widgets by flush_devices on the main thread.
+        """
+        bus = self.micro_sim.bus
+        ports = self.micro_sim.ports
+        bus.clear()
+        scheduler = self.device_scheduler
+        scheduler.clear()
+        bus.attach(ports['traffic_light'], scheduler.wrap(self.light.port_written))
+        # The control bit picks the digit written
+        bus.attach(ports['seven_segment_display'],
+                   scheduler.wrap(self.seven_segment_display.port_written, key=lambda address, value: value & 1))
+        bus.attach(ports['ascii_table'], scheduler.wrap(self.ascii.port_written), len(self.ascii.labels))
+        # Lets the keyboard know when the program consumed a key. Loads and step backs are not the program.
+        keyboard_input = self.hex_keyboard_layout.input
+        keyboard_input.port = ports['hex_keyboard']
+        bus.attach(ports['hex_keyboard'], keyboard_input.port_written, refresh=False)
+
+    def flush_devices(self):
+        """
+        Applies the port writes collected since the previous frame to the device widgets, which skip
+        the ones not changing what they show
+        """
+        self.device_scheduler.flush()
+
     def update_io(self, dt):
         """
-        Updates IO devices on run/debug events
+        Updates IO devices after memory changed without going through the I/O bus, such as a load,
+        a clear or a step back
         :param dt: float
         """
-        self.light.change_color(traffic_lights_binary())
-        self.seven_segment_display.activate_segments(seven_segment_binary())
-        self.ascii.update_ascii_grid()
+        self.micro_sim.bus.refresh(self.micro_sim.ram)
+        self.flush_devices()
 
 
 class MainWindow(BoxLayout):
@@ -158,6 +189,13 @@ class MainWindow(BoxLayout):
 
         self.first_inst = True
         self.step_assembly = False
+        # Whether each Debug step added a row to the instruction table, which skips blank words, so step back
+        # removes a row only for the steps that added one. As long as the undo journal.
+        self.step_rows = deque(maxlen=10000)
+        self.worker = None  # SimulationWorker started by the Run button
+        self.clock_rate = None  # Instructions per second the Run button emulates, None for full speed
+        self.frame_budgeted = False  # Runs at full speed between frames on the UI thread, see FrameRunner
+        self.frame_event = None  # Clock event painting the worker's frames
 
         self.ids['left_actions'] = BoxLayout()
         self.orientation = 'vertical'
@@ -196,6 +234,13 @@ class MainWindow(BoxLayout):
                                                         'y': self.buttons_y_pos
                                                     },
                                                     on_release=self.run_micro_instructions)
+        self.stop_button = MDFillRoundFlatIconButton(text='Stop',
+                                                     icon='stop',
+                                                     size_hint=(None, None),
+                                                     pos_hint={
+                                                         'y': self.buttons_y_pos
+                                                     },
+                                                     on_release=self.stop_micro_instructions)
         self.debug_button = MDFillRoundFlatIconButton(text='Debug',
                                                       icon='android-debug-bridge',
                                                       size_hint=(None, None),
@@ -203,6 +248,13 @@ class MainWindow(BoxLayout):
                                                           'y': self.buttons_y_pos
                                                       },
                                                       on_release=self.run_micro_instructions_step)
+        self.step_back_button = MDFillRoundFlatIconButton(text='Back',
+                                                          icon='step-backward',
+                                                          size_hint=(None, None),
+                                                          pos_hint={
+                                                              'y': self.buttons_y_pos
+                                                          },
+                                                          on_release=self.run_micro_instructions_step_back)
         self.refresh_button = MDFillRoundFlatIconButton(text='Clear',
                                                         icon='refresh',
                                                         size_hint=(None, None),
@@ -243,7 +295,9 @@ class MainWindow(BoxLayout):
                                             on_release=self.buttons_information
                                             )
         self.md_toolbar.add_widget(self.run_button)
+        self.md_toolbar.add_widget(self.stop_button)
         self.md_toolbar.add_widget(self.debug_button)
+        self.md_toolbar.add_widget(self.step_back_button)
         self.md_toolbar.add_widget(self.refresh_button)
         self.md_toolbar.add_widget(self.save_button)
         self.md_toolbar.add_widget(self.pop_button)
@@ -254,61 +308,120 @@ class MainWindow(BoxLayout):
 
     def run_micro_instructions(self, instance):
         """
-        Runs micro instructions from start to finish
+        Runs micro instructions from start to finish on a SimulationWorker, painting its frames until
+        it finishes or the Stop button is pressed
         :param instance: obj
         """
-        toast_message = 'File executed successfully'
-        if not self.run_window.editor.valid_text and not EVENTS['IS_OBJ']:
+        if self.is_simulating():
+            toast('Program already running')
+        elif not self.run_window.editor.valid_text and not EVENTS['IS_OBJ']:
             toast("Invalid code. Load file to run or write valid code in editor")
         elif EVENTS['EDITOR_SAVED']:
-            self.clear_run()
-            # If file is an .obj file, runs simulator
-            if EVENTS['FILE_PATH'].endswith('.obj'):
-                self.run_micro_sim(EVENTS['FILE_PATH'])
-            else:
-                self.assembler()
-                
-            self.micro_sim.is_running = True
-            if self.micro_sim.is_ram_loaded:
-                for m in range(2):
-                    if self.first_inst:
-                        self.run_window.inst_table.data_list.clear()
-                        self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                            self.micro_sim.disassembled_instruction())
-                        self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                            self.micro_sim.disassembled_instruction())
-                        self.first_inst = False
-                    else:
-                        self.run_window.blinking_on()
-                        self.run_window.blinking_off()
+            # After a breakpoint or watchpoint, continues from where the program stopped
+            if self.micro_sim.stopped_at is None or not self.micro_sim.is_ram_loaded:
+                self.clear_run()
+                # If file is an .obj file, runs simulator
+                if EVENTS['FILE_PATH'].endswith('.obj'):
+                    self.run_micro_sim(EVENTS['FILE_PATH'])
+                else:
+                    self.assembler()
 
-                        timeout = time.time() + 5  # 5 seconds from now
-                        while self.micro_sim.is_running:
-                            try:
-                                self.micro_sim.run_micro_instructions(timeout)
-                                self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                                    self.micro_sim.disassembled_instruction())
-                                self.run_window.seven_segment_display.activate_segments(seven_segment_binary())
-                                
-                            except (SystemError, TimeoutError, IndexError) as e:
-                                self.micro_sim.is_running = False
-                                traceback.print_exc()
-                                toast_message = f'Error! {e}'
+                if self.micro_sim.is_ram_loaded:
+                    self.run_window.inst_table.clear_data()
+                    self.run_window.inst_table.add_instruction(self.micro_sim.program_counter)
+                    self.run_window.inst_table.update_data()
+                    self.first_inst = False
 
-                    self.run_window.reg_table.get_data()
-                    self.run_window.mem_table.data_list.clear()
-                    self.run_window.mem_table.get_data()
-                    self.run_window.event_io()
-                    toast(toast_message)
+            if self.micro_sim.is_ram_loaded:
+                self.run_window.blinking_on()
+                self.run_window.blinking_off()
+
+                # The undo journal is for Debug steps. Recording every instruction of a run would slow it down
+                # several times and keep it off the compiled blocks.
+                self.micro_sim.disable_journal()
+                # No cycle detection: a program polling the hex keyboard repeats its state until a key is
+                # pressed, and loops such as a traffic light cycle are meant to be watched. Stop ends them.
+                if self.clock_rate is None and self.frame_budgeted:
+                    # Runs between the frames Kivy paints, so paint every frame
+                    self.worker = FrameRunner(self.micro_sim, detect_cycles=False)
+                    interval = 0
+                else:
+                    self.worker = SimulationWorker(self.micro_sim, detect_cycles=False, rate=self.clock_rate)
+                    interval = 1 / 30
+                self.worker.start()
+                self.frame_event = Clock.schedule_interval(self.paint_frame, interval)
         else:
             toast('Please save changes on editor before running')
 
+    def paint_frame(self, dt):
+        """
+        Paints the latest frame published by the running SimulationWorker, and the result once it finishes
+        :param dt: float
+        """
+        self.worker.run_frame(dt)
+        frame = self.worker.take_frame()
+        if frame is None:
+            return
+        inst_table = self.run_window.inst_table
+        for address, word in frame.rows:
+            inst_table.history.append(address, word)
+        inst_table.update_data()
+        self.run_window.reg_table.get_data(frame.registers)
+        self.run_window.mem_table.update_data(frame.dirty, frame.ram)
+        self.run_window.flush_devices()
+
+        rate = self.worker.rate
+        if rate is not None:
+            self.md_toolbar.title = f'Semref Micro Sim  {frame.rate:.0f} / {rate} Hz'
+
+        result = frame.result
+        if result is not None:
+            self.frame_event.cancel()
+            self.frame_event = None
+            self.micro_sim.enable_journal()
+            self.md_toolbar.title = 'Semref Micro Sim'
+            if result.reason == HALT:
+                toast_message = 'File executed successfully'
+            elif result.reason == ERROR:
+                toast_message = f'Error! {result.error}'
+            elif result.reason == STOPPED:
+                toast_message = f'Program stopped after {result.steps} instructions'
+            else:
+                toast_message = f'Stopped at {result.reason}'
+                if result.address is not None:
+                    # Breakpoints and watchpoints
+                    toast_message += f' {result.address:03X}'
+            if rate is not None:
+                # Shows whether the host kept up with the clock rate
+                toast_message += f'. Ran at {frame.rate:.0f} Hz of {rate} Hz'
+            toast(toast_message)
+
+    def stop_micro_instructions(self, instance):
+        """
+        Stops the program started with the Run button
+        :param instance: obj
+        """
+        if self.is_simulating():
+            self.worker.stop()
+        else:
+            toast('No program running')
+
+    def is_simulating(self):
+        """
+        :return: bool whether a program started with the Run button has not finished painting
+        """
+        return self.frame_event is not None
+
     def run_micro_instructions_step(self, instance):
-        if not self.run_window.editor.valid_text and not EVENTS['IS_OBJ']:
+        if self.is_simulating():
+            toast('Stop the running program first')
+        elif not self.run_window.editor.valid_text and not EVENTS['IS_OBJ']:
             toast("Invalid code. Load file to run or write valid code in editor")
         elif EVENTS['EDITOR_SAVED']:
-            # If file is an .obj file, runs simulator
-            if self.step_assembly == False:
+            stopped_at = self.micro_sim.stopped_at if self.micro_sim.is_ram_loaded else None
+            # If file is an .obj file, runs simulator. After a breakpoint or watchpoint, continues from where
+            # the program stopped.
+            if self.step_assembly == False and stopped_at is None:
                 if EVENTS['FILE_PATH'].endswith('.obj'):
                     self.run_micro_sim(EVENTS['FILE_PATH'])
 
@@ -318,35 +431,59 @@ class MainWindow(BoxLayout):
 
             self.run_window.blinking_on.cancel()
             self.run_window.blinking_off.cancel()
-            if not self.micro_sim.is_running:
+            if not self.micro_sim.is_running and stopped_at is None:
                 self.clear_run()
                 self.micro_sim.is_running = True
             else:
+                if stopped_at is not None:
+                    self.micro_sim.resume()
                 if self.micro_sim.is_ram_loaded:
 
                     if self.first_inst:
-                        self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                            self.micro_sim.disassembled_instruction())
+                        self.run_window.inst_table.add_instruction(self.micro_sim.program_counter)
                         self.first_inst = False
                     else:
                         self.run_window.blinking_on()
                         self.run_window.blinking_off()
+                        added = False
                         try:
                             self.micro_sim.run_micro_instructions()
-                            self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                                self.micro_sim.disassembled_instruction())
+                            added = self.run_window.inst_table.add_instruction(self.micro_sim.program_counter)
+                            if self.micro_sim.stopped_at is not None:
+                                reason, address = self.micro_sim.stopped_at
+                                toast(f'Stopped at {reason} {address:03X}')
                         except (SystemError, TimeoutError, IndexError) as e:
                             self.micro_sim.is_running = False
                             traceback.print_exc()
                             toast(f'Error! {e}')
+                        self.step_rows.append(added)
 
+                    self.run_window.inst_table.update_data()
                     self.run_window.reg_table.get_data()
-                    self.run_window.mem_table.data_list.clear()
-                    self.run_window.mem_table.get_data()
-                    self.run_window.event_io()
+                    self.run_window.mem_table.update_data(self.micro_sim.take_dirty())
+                    self.run_window.flush_devices()
         else:
             toast('Please save changes on editor before running')
 
+    def run_micro_instructions_step_back(self, instance):
+        """
+        Undoes the last instruction run in debug mode
+        :param instance: obj
+        """
+        if self.is_simulating():
+            toast('Stop the running program first')
+            return
+        if not self.micro_sim.is_ram_loaded or not self.micro_sim.step_back():
+            toast('No instruction to step back from')
+            return
+        inst_table = self.run_window.inst_table
+        if self.step_rows and self.step_rows.pop() and len(inst_table.history):
+            inst_table.history.pop()
+        inst_table.update_data()
+        self.run_window.reg_table.get_data()
+        self.run_window.mem_table.update_data(self.micro_sim.take_dirty())
+        self.run_window.event_io()
+
     def assembler(self):
         i = 0
         # Obtains last name on path string using ntpath and then
@@ -354,16 +491,16 @@ class MainWindow(BoxLayout):
         # Should work across different OS
         filename = os.path.splitext(ntpath.basename(EVENTS['FILE_PATH']))[0]
         try:
-            asm = Assembler(filename=EVENTS['FILE_PATH'])
+            asm = Assembler(filename=EVENTS['FILE_PATH'], ram=RAM)
             asm.read_source()
             asm.store_instructions_in_ram()
-            verify_ram_content()
-            hexify_ram_content()
+            asm.verify_ram_content()
+            asm.hexify_ram_content()
             output_file_location = 'output/' + filename + '.obj'
 
             f = open(output_file_location, 'w')
             while i < 100:
-                f.write(f'{RAM[i]} {RAM[i + 1]}' + '\n')
+                f.write(f'{RAM_HEX[i]} {RAM_HEX[i + 1]}' + '\n')
                 i += 2
             f.close()
 
@@ -375,11 +512,23 @@ class MainWindow(BoxLayout):
             toast(f'{e}')
 
     def run_micro_sim(self, file):
-        self.micro_sim.read_obj_file(file)
+        try:
+            self.micro_sim.read_obj_file(file)
+        except (AssertionError, FileNotFoundError, ValueError, MemoryError, SyntaxError) as e:
+            # is_ram_loaded stays False, so the caller does not run the program
+            traceback.print_exc()
+            toast(f'{e}')
+            return
+        # Loading is not tracked by MicroSim.take_dirty, refresh the whole table.
+        self.run_window.mem_table.data_list.clear()
+        self.run_window.mem_table.get_data()
+        self.run_window.update_io(0)
 
     def clear_dialog(self, instance):
 
-        if EVENTS['EDITOR_SAVED']:
+        if self.is_simulating():
+            toast('Stop the running program first')
+        elif EVENTS['EDITOR_SAVED']:
             self.clear()
         elif EVENTS['IS_RAM_EMPTY']:
             toast('There is nothing to clear')
@@ -419,18 +568,15 @@ class MainWindow(BoxLayout):
             self.run_window.reg_table.get_data()
             self.run_window.mem_table.data_list.clear()
             self.run_window.mem_table.get_data()
-            self.run_window.inst_table.data_list.clear()
-            self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                                self.micro_sim.disassembled_instruction())
+            self.run_window.inst_table.clear_data()
+            self.step_rows.clear()
             self.first_inst = True
 
             self.run_window.blinking_on.cancel()
             self.run_window.blinking_off.cancel()
 
-            self.run_window.light.change_color(traffic_lights_binary())
-            self.run_window.ascii.update_ascii_grid()
-            self.run_window.seven_segment_display.activate_segments(
-                seven_segment_binary())
+            self.run_window.hex_keyboard_layout.input.reset()
+            self.run_window.update_io(0)
             self.run_window.seven_segment_display.clear_seven_segment()
             toast('Micro memory cleared! Load new data')
             EVENTS['IS_RAM_EMPTY'] = True
@@ -447,18 +593,16 @@ class MainWindow(BoxLayout):
         self.run_window.reg_table.get_data()
         self.run_window.mem_table.data_list.clear()
         self.run_window.mem_table.get_data()
-        self.run_window.inst_table.data_list.clear()
-        self.run_window.inst_table.get_data(self.micro_sim.program_counter,
-                                            self.micro_sim.disassembled_instruction())
+        self.run_window.inst_table.clear_data()
+        self.step_rows.clear()
         self.first_inst = True
 
         self.run_window.blinking_on.cancel()
         self.run_window.blinking_off.cancel()
 
-        self.run_window.light.change_color(traffic_lights_binary())
-        self.run_window.ascii.update_ascii_grid()
-        self.run_window.seven_segment_display.activate_segments(
-            seven_segment_binary())
+        # The key in the port was cleared with memory
+        self.run_window.hex_keyboard_layout.input.reset()
+        self.run_window.update_io(0)
         self.run_window.seven_segment_display.clear_seven_segment()
 
     def open_reg_mem_save_dialog(self, instance):
@@ -524,6 +668,8 @@ class MainWindow(BoxLayout):
             toast('File saved in input folder as ' + filename + '.asm')
             EVENTS['EDITOR_SAVED'] = True
             EVENTS['FILE_PATH'] = 'input/' + filename + '.asm'
+            # Run and Debug load the saved program rather than continue the stopped one
+            self.micro_sim.stopped_at = None
             EVENTS['LOADED_FILE'] = True
             update_indicators(self, EVENTS['LOADED_FILE'])
         else:
@@ -551,8 +697,8 @@ class MainWindow(BoxLayout):
 
             i = 0
             f.write('\nMemory Content: \n')
-            while i < len(RAM):
-                f.write(f'\n{RAM[i]}    {RAM[i + 1]}')
+            while i < len(RAM_HEX):
+                f.write(f'\n{RAM_HEX[i]}    {RAM_HEX[i + 1]}')
                 i += 2
 
             toast('File saved in output folder as ' + filename + '.txt')
@@ -613,8 +759,21 @@ class NavDrawer(MDNavigationDrawer):
 
         self.add_widget(self.traffic_lights)
         self.add_widget(self.seven_segment)
+        self.breakpoints = NavigationDrawerIconButton(icon='bug',
+                                                      text='Toggle Breakpoint',
+                                                      on_release=self.breakpoint_config_open)
+        self.clock_rate = NavigationDrawerIconButton(icon='timer',
+                                                     text='Clock Rate. Current: Full speed',
+                                                     on_release=self.clock_rate_config_open)
+
         self.add_widget(self.ascii_table)
         self.add_widget(self.hex_keyboard)
+        self.add_widget(self.breakpoints)
+        self.add_widget(self.clock_rate)
+        self.run_mode = NavigationDrawerIconButton(icon='speedometer',
+                                                   text='Run Mode. Current: Background',
+                                                   on_release=self.toggle_run_mode)
+        self.add_widget(self.run_mode)
 
     def io_config_open(self, instance):
         """
@@ -685,12 +844,98 @@ class NavDrawer(MDNavigationDrawer):
                             self.hex_keyboard.text = HEX_KEYBOARD['menu_title'] + '. Current Port: ' + str(
                                 HEX_KEYBOARD['port'])
                             toast_message = f'Changed HEX Keyboard I/O port number to {port}'
+                        self.micro_sim.ports.update(device_ports())
+                        self.main_window.run_window.attach_devices()
                         toast(toast_message)
                     else:
                         toast('Invalid input. That port is reserved!')
             except ValueError as e:
                 toast(f'Not a valid port!')
 
+    def breakpoint_config_open(self, instance):
+        """
+        Opens breakpoint configuration
+        :param instance: obj
+        """
+        dialog = MDInputDialog(title=instance.text,
+                               hint_text='Input instruction address [000-FFF]',
+                               text_button_ok='Save',
+                               text_button_cancel='Cancel',
+                               events_callback=self.toggle_breakpoint)
+        if self.dpi < 192:
+            dialog.size_hint = (dp(0.4), dp(0.4))
+        else:
+            dialog.size_hint = (dp(0.2), dp(0.2))
+            dialog.pos_hint = {
+                'x': dp(0.15),
+                'y': dp(0.15)
+            }
+        dialog.open()
+
+    def toggle_breakpoint(self, *args):
+        """
+        Sets a breakpoint, or removes it if already set
+        :param args: tuple
+        """
+        if args[0] == 'Save':
+            try:
+                address = int(args[1].text_field.text, 16)
+                enabled = not self.micro_sim.breakpoints[address]
+                self.micro_sim.set_breakpoint(address, enabled)
+                toast(f'Breakpoint {"set" if enabled else "removed"} at {address:03X}')
+            except (ValueError, IndexError):
+                toast('Invalid address. Valid addresses [000-FFF]')
+
+    def clock_rate_config_open(self, instance):
+        """
+        Opens clock rate configuration
+        :param instance: obj
+        """
+        dialog = MDInputDialog(title='Clock Rate',
+                               hint_text=f'Instructions per second [{MIN_CLOCK_RATE}-{MAX_CLOCK_RATE}], '
+                                         f'empty for full speed',
+                               text_button_ok='Save',
+                               text_button_cancel='Cancel',
+                               events_callback=self.set_clock_rate)
+        if self.dpi < 192:
+            dialog.size_hint = (dp(0.4), dp(0.4))
+        else:
+            dialog.size_hint = (dp(0.2), dp(0.2))
+            dialog.pos_hint = {
+                'x': dp(0.15),
+                'y': dp(0.15)
+            }
+        dialog.open()
+
+    def set_clock_rate(self, *args):
+        """
+        Sets the clock rate the Run button emulates
+        :param args: tuple
+        """
+        if args[0] == 'Save':
+            text = args[1].text_field.text.strip()
+            try:
+                rate = int(text) if text else None
+                if rate is not None and not MIN_CLOCK_RATE <= rate <= MAX_CLOCK_RATE:
+                    raise ValueError
+            except ValueError:
+                toast(f'Invalid clock rate. Valid rates [{MIN_CLOCK_RATE}-{MAX_CLOCK_RATE}]')
+                return
+            self.main_window.clock_rate = rate
+            current = 'Full speed' if rate is None else f'{rate} Hz'
+            self.clock_rate.text = f'Clock Rate. Current: {current}'
+            toast(f'Clock rate set to {current}')
+
+    def toggle_run_mode(self, instance):
+        """
+        Switches full speed runs between a background thread and frame budgets on the UI thread
+        :param instance: obj
+        """
+        self.main_window.frame_budgeted = not self.main_window.frame_budgeted
+        mode = 'Frame budget' if self.main_window.frame_budgeted else 'Background'
+        self.run_mode.text = f'Run Mode. Current: {mode}'
+        toast(f'Full speed runs use {mode.lower()} mode')
+
     def file_manager_open(self, instance):
         """
         Opens file manager
@@ -726,6 +971,8 @@ class NavDrawer(MDNavigationDrawer):
 
         EVENTS['CAN_WRITE'] = True
         EVENTS['FILE_PATH'] = path
+        # Run and Debug load the new file rather than continue the stopped program
+        self.main_window.micro_sim.stopped_at = None
         EVENTS['LOADED_FILE'] = True
         toast(f'{path} loaded successfully')
         EVENTS['IS_RAM_EMPTY'] = False
@@ -752,7 +999,7 @@ class RegisterTable(RecycleView):
     def __init__(self, **kwargs):
         self.dpi = kwargs.pop('dpi')
         super(RegisterTable, self).__init__(**kwargs)
-        self.viewclass = 'Label'
+        self.viewclass = 'GridCell'
         self.recycle_grid_layout = self.children[0]
         if self.dpi < 192:
             self.pos_hint = {
@@ -761,12 +1008,6 @@ class RegisterTable(RecycleView):
             }
             self.size_hint_x = dp(0.2)
             self.size_hint_y = dp(0.5)
-            with self.children[0].canvas.before:
-                Color(.50, .50, .50, 1)
-                for i in range(13):
-                    Line(width=2,
-                         rectangle=(dp(0), dp(0), dp(205), dp(390 - (30 * i))))
-                Line(width=2, rectangle=(dp(0), dp(0), dp(102.5), dp(390)))
         else:
             self.pos_hint = {
                 'x': dp(0),
@@ -775,23 +1016,18 @@ class RegisterTable(RecycleView):
             self.size_hint_x = dp(0.12)
             self.size_hint_y = dp(0.265)
             self.recycle_grid_layout.size_hint_x = dp(0.47)
-            with self.children[0].canvas.before:
-                Color(.50, .50, .50, 1)
-                for i in range(13):
-                    Line(width=2,
-                         rectangle=(dp(0), dp(0), dp(245), dp(390 - (30 * i))))
-                Line(width=2, rectangle=(dp(0), dp(0), dp(115), dp(390)))
 
-    def get_data(self):
+    def get_data(self, registers=REGISTER):
         """
         Updates Register Table
+        :param registers: mapping of register name -> hexadecimal text, such as a worker.Frame's registers
         """
         _data_list = self.data_list.copy()
         self.data_list.clear()
         self.data_list.append('REGISTER')
         self.data_list.append('VALUE')
         _data = []
-        for k, v in REGISTER.items():
+        for k, v in registers.items():
             self.data_list.append(k)
             self.data_list.append(v)
 
@@ -827,7 +1063,9 @@ class MemoryTable(RecycleView):
     def __init__(self, **kwargs):
         self.dpi = kwargs.pop('dpi')
         super(MemoryTable, self).__init__(**kwargs)
-        self.viewclass = 'Label'
+        # Cells draw their own borders, so only the rows shown are drawn
+        self.viewclass = 'GridCell'
+        self.highlighted = []  # Cells of the bytes changed by the last update_data
         self.recycle_grid_layout = self.children[0]
         if self.dpi < 192:
             self.pos_hint = {
@@ -838,12 +1076,6 @@ class MemoryTable(RecycleView):
             self.size_hint_y = dp(0.5)
             self.recycle_grid_layout.default_size_hint = (dp(0.5), None)
             self.recycle_grid_layout.size_hint_x = dp(0.83)
-            with self.children[0].canvas.before:
-                Color(.50, .50, .50, 1)
-                for i in range(2049):
-                    Line(width=2,
-                         rectangle=(dp(0), dp(0), dp(255), dp(61470 - (30 * i))))
-                Line(width=2, rectangle=(dp(0), dp(0), dp(127.5), dp(61470)))
         else:
             self.pos_hint = {
                 'x': dp(0.37),
@@ -853,12 +1085,6 @@ class MemoryTable(RecycleView):
             self.size_hint_y = dp(0.265)
             self.recycle_grid_layout.default_size_hint = (dp(0.5), None)
             self.recycle_grid_layout.size_hint_x = dp(0.47)
-            with self.children[0].canvas.before:
-                Color(.50, .50, .50, 1)
-                for i in range(2049):
-                    Line(width=2,
-                         rectangle=(dp(0), dp(0), dp(270), dp(61470 - (30 * i))))
-                Line(width=2, rectangle=(dp(0), dp(0), dp(135), dp(61470)))
 
     def get_data(self):
         """
@@ -867,25 +1093,55 @@ class MemoryTable(RecycleView):
         self.data_list.append('MEMORY BYTE')
         self.data_list.append('MEMORY BYTE')
         i = 0
-        while i < len(RAM):
-            self.data_list.append(f'{RAM[i]}')
-            self.data_list.append(f'{RAM[i + 1]}')
+        while i < len(RAM_HEX):
+            self.data_list.append(RAM_HEX[i])
+            self.data_list.append(RAM_HEX[i + 1])
             i += 2
 
         self.data = [{
             "text": str(x.upper()),
             "color": (.1, .1, .1, 1)
         } for x in self.data_list]
+        self.highlighted = []
+
+    def update_data(self, addresses, ram=None):
+        """
+        Updates only the cells of the given addresses, highlighting the ones that changed
+        like the Register table does
+        :param addresses: list of int, such as MicroSim.take_dirty returns
+        :param ram: bytes to read the cells from instead of RAM, such as a worker.Frame's ram
+        """
+        ram_hex = RAM_HEX if ram is None else HexView(ram)
+        if len(self.data) != len(RAM_HEX) + 2:
+            self.data_list.clear()
+            self.get_data()
+            return
+        for cell in self.highlighted:
+            self.data[cell]['color'] = (.1, .1, .1, 1)
+        self.highlighted = []
+        for address in addresses:
+            # The first two cells are the headers
+            cell = address + 2
+            text = ram_hex[address]
+            if self.data_list[cell] != text:
+                self.data_list[cell] = text
+                self.data[cell]['text'] = text.upper()
+                self.data[cell]['color'] = (1, 0, 0, 1)
+                self.highlighted.append(cell)
+        self.refresh_from_data()
 
 
 class InstructionTable(RecycleView):
     """Disassembly of executed code"""
-    data_list = ListProperty([])
 
     def __init__(self, **kwargs):
         self.dpi = kwargs.pop('dpi')
         super(InstructionTable, self).__init__(**kwargs)
         self.viewclass = 'Label'
+        # Disassembly cells name their own class, the other cells fall back to viewclass
+        self.key_viewclass = 'viewclass'
+        self.history = InstructionHistory()
+        self.shown = 0  # History total when the table was last updated
         self.pos_hint = {
             'x': dp(0.2),
             'center_y': dp(0.75)
@@ -900,25 +1156,85 @@ class InstructionTable(RecycleView):
             self.size_hint_x = dp(0.25)
             self.size_hint_y = dp(0.265)
 
-    def get_data(self, address, instruction):
+    def clear_data(self):
+        """
+        Empties the history and the table
+        """
+        self.history.clear()
+        self.shown = 0
+        self.data = [{
+            'text': text,
+            'color': (.1, .1, .1, 1)
+        } for text in ('ADDRESS', 'CONTENT', 'DISASSEMBLY')]
+
+    def add_instruction(self, address):
         """
-        Updates Instructions Table
+        Records the instruction at an address in the history. Blank words are skipped.
+        Call update_data to show it.
         :param address: int
-        :param instruction: str
+        :return: bool whether a row was added
         """
-        if not self.data_list:
-            self.data_list.append('ADDRESS')
-            self.data_list.append('CONTENT')
-            self.data_list.append('DISASSEMBLY')
-        elif f'{RAM[address]}{RAM[address + 1]}' != '0000' and instruction:
-            self.data_list.append(f'{address:02x}'.upper())
-            self.data_list.append(f'{RAM[address]}')
-            self.data_list.append(instruction.upper())
+        word = RAM[address] << 8 | RAM[address + 1]
+        if word:
+            self.history.append(address, word)
+        return bool(word)
 
-        self.data = [{
-            "text": str(x.upper()),
-            "color": (.1, .1, .1, 1)
-        } for x in self.data_list]
+    def update_data(self):
+        """
+        Updates Instructions Table with the rows added to or removed from the history since the last update.
+        The rows added are appended to the view data. Once it holds twice as many rows as the history,
+        the oldest are dropped in one batch.
+        """
+        history = self.history
+        change = history.total - self.shown
+        rows = len(self.data) // 3 - 1
+        if change < 0:
+            # Stepped back
+            del self.data[3 * (1 + max(0, rows + change)):]
+        elif change > len(history):
+            self.data = self.data[:3] + self.cells(range(len(history)))
+        elif change:
+            if rows + change > 2 * history.capacity:
+                del self.data[3:3 * (rows + change - history.capacity + 1)]
+            self.data.extend(self.cells(range(len(history) - change, len(history))))
+        self.shown = history.total
+
+    def cells(self, indexes):
+        """
+        Gets the view data of history rows. The disassembly is made by the cell once it is shown.
+        :param indexes: range of history positions
+        :return: list of dict
+        """
+        cells = []
+        for index in indexes:
+            address, word = self.history[index]
+            cells.append({'text': f'{address:02X}', 'color': (.1, .1, .1, 1)})
+            cells.append({'text': f'{word:04X}', 'color': (.1, .1, .1, 1)})
+            cells.append({'viewclass': 'DisassemblyLabel', 'word': word, 'color': (.1, .1, .1, 1)})
+        return cells
+
+
+class DisassemblyLabel(Label):
+    """Instruction table cell that disassembles its word only when shown"""
+    word = NumericProperty(0)
+
+    def on_word(self, instance, word):
+        """
+        Disassembles the instruction word given by the table data
+        :param instance: obj
+        :param word: int
+        """
+        self.text = disassemble(word)
+
+
+Factory.register('DisassemblyLabel', cls=DisassemblyLabel)
+
+
+class GridCell(Label):
+    """Table cell drawing its own border, see semref.kv"""
+
+
+Factory.register('GridCell', cls=GridCell)
 
 
 class TextEditor(CodeInput):
@@ -995,7 +1311,8 @@ class GUI(NavigationLayout):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.app = App.get_running_app()
-        self.micro_sim = MicroSim()
+        self.micro_sim = MicroSim(ram=RAM, registers=REGISTER)
+        self.micro_sim.enable_journal()
         self.dpi = MetricsBase().dpi
         self.main_window = MainWindow(nav_drawer=self,
                                       app=self.app,
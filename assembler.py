@@ -1,51 +1,6 @@
 import re
 
-from utils import OPCODE, convert_to_binary, RAM, is_valid_file
-
-VARIABLES = {}
-CONSTANTS = {}
-
-
-def verify_ram_content():
-    """
-    Verifies ram is in binary format. If not will do the necessary changes to achieve this
-    """
-    i = 0
-    for num in range(2048):
-        if RAM[i] in ('jmprind', 'jcondrin'):
-            opcode = OPCODE[RAM[i]]
-            register_a = convert_to_binary(int(RAM[i + 1][1]), 3)
-            binary = opcode + register_a + '00000000'
-            RAM[i] = binary[0:8]
-            RAM[i + 1] = binary[8:]
-        elif RAM[i] in ('jmpaddr', 'jcondaddr', 'call'):
-            opcode = OPCODE[RAM[i]]
-            if RAM[i + 1] not in VARIABLES:
-                if re.match(r'^[A-Za-z][A-Za-z0-9]*$', RAM[i + 1]):
-                    raise SyntaxError(f'Invalid label {RAM[i + 1]}. Please input a valid and defined label.')
-                elif not re.match(r'^[0-9]+$', RAM[i + 1]):
-                    raise SyntaxError(f'Invalid label {RAM[i + 1]}. Labels must start with letters!! Please input a valid and defined label.')
-                address = f'{int(RAM[i + 1], 16):011b}'
-            else:
-                
-                address = VARIABLES[RAM[i + 1]]
-            binary = opcode + address if len(address) == 11 else address
-            RAM[i] = binary[0:8]
-            RAM[i + 1] = binary[8:]
-        i += 2
-
-
-def hexify_ram_content():
-    """
-    Converts binary content inside of RAM to hexadecimal
-    """
-    i = 0
-    while i < len(RAM):
-        try:
-            RAM[i] = f'{int(RAM[i], 2):02X}'
-        except (ValueError):
-            print('assmbly')
-        i += 1
+from utils import OPCODE, RAM_SIZE, convert_to_binary, is_valid_file
 
 
 def verify_indentation(line, index, file):
@@ -119,6 +74,14 @@ class Assembler:
         self.micro_instr = []  # Microprocessor instruction.
         self.p_counter = 0  # Program Counter.
         self.filename = kwargs.pop('filename', None)
+        self.ram = kwargs.pop('ram', None)  # Assembled program, the GUI passes utils.RAM.
+        if self.ram is None:
+            self.ram = bytearray(RAM_SIZE)
+        self.variables = {}
+        self.constants = {}
+        # Binary text of each memory cell while a program is being assembled.
+        # Copied into ram as bytes by hexify_ram_content once labels are resolved.
+        self.binary_ram = ['00000000'] * len(self.ram)
 
     def read_source(self, filepath=None):
         """
@@ -154,6 +117,7 @@ class Assembler:
         """
         Stores instructions in ram
         """
+        self.binary_ram[:] = ['00000000'] * len(self.ram)
         for instruction in self.micro_instr:
             if instruction:
                 is_first_inst = self.micro_instr.index(instruction) == 0
@@ -165,7 +129,7 @@ class Assembler:
                         raise SyntaxError(f'Invalid label {source[0]}. Labels must start with letters!! Please define a valid label.')
                     self.correct_p_counter()
                     label = source[0][:-1]
-                    VARIABLES[label] = f'{self.p_counter:011b}'
+                    self.variables[label] = f'{self.p_counter:011b}'
                     if source[0].lower() in OPCODE:
                         raise SyntaxError('Invalid instruction')
 
@@ -201,16 +165,16 @@ class Assembler:
                             self.p_counter += 2  # Increase Program Counter
                         elif source[0].lower() == 'const':
                             const = f'{int(source[2], 16):08b}'
-                            CONSTANTS[source[1]] = const
+                            self.constants[source[1]] = const
 
                         elif 'db' in source:
                             if source[0].lower() in OPCODE:
                                 raise SyntaxError(
                                     f'{source[0].lower()} cannot be used as a variable')
-                            VARIABLES[source[0]] = convert_to_binary(
+                            self.variables[source[0]] = convert_to_binary(
                                 self.p_counter, 8)
                             for i in range(2, len(source)):
-                                RAM[self.p_counter] = convert_to_binary(
+                                self.binary_ram[self.p_counter] = convert_to_binary(
                                     int(source[i], 16), 8)
                                 self.p_counter += 1
                         else:
@@ -224,8 +188,8 @@ class Assembler:
         """
         instruction = inst[0].lower()
         if instruction.lower() in ('jmprind', 'jmpaddr', 'jcondrin', 'jcondaddr', 'call'):
-            RAM[self.p_counter] = inst[0].lower()
-            RAM[self.p_counter + 1] = inst[1]
+            self.binary_ram[self.p_counter] = inst[0].lower()
+            self.binary_ram[self.p_counter + 1] = inst[1]
         else:
             opcode = OPCODE[instruction]
             error = f"'{inst}' is an invalid instruction. Refer to manual for proper use."
@@ -237,10 +201,10 @@ class Assembler:
                     raise SyntaxError(f'Incorrect syntax for {inst}. Only accepts Register values as first input')
                 register_a = convert_to_binary(
                     int(re.sub(r'[^\w\s]', '', inst[1])[1]), 3)
-                if inst[2] in VARIABLES:
-                    address_or_const = VARIABLES[inst[2]]
-                elif inst[2] in CONSTANTS:
-                    address_or_const = CONSTANTS[inst[2]]
+                if inst[2] in self.variables:
+                    address_or_const = self.variables[inst[2]]
+                elif inst[2] in self.constants:
+                    address_or_const = self.constants[inst[2]]
                 # elif not re.match(r'#([0-9]+)', inst[2]):
                     # raise SyntaxError(error)
                 elif '#' in inst[2]:
@@ -258,10 +222,10 @@ class Assembler:
                     raise SyntaxError(f'Incorrect syntax for {inst}. Only accepts Register values as first input')
                 register_a = convert_to_binary(
                     int(register_a[1]), 3)
-                if inst[2] in VARIABLES:
-                    address_or_const = VARIABLES[inst[2]]
-                elif inst[2] in CONSTANTS:
-                    address_or_const = CONSTANTS[inst[2]]
+                if inst[2] in self.variables:
+                    address_or_const = self.variables[inst[2]]
+                elif inst[2] in self.constants:
+                    address_or_const = self.constants[inst[2]]
                 elif '#' in inst[2]:
                     raise SyntaxError(f'Incorrect syntax for {inst}. Must pass an address')
                 else:
@@ -280,10 +244,10 @@ class Assembler:
                 register_a = convert_to_binary(
                     int(re.sub(r'[^\w\s]', '', inst[2])[1]), 3)
                 variable = re.sub(r'[^\w\s]', '', inst[1])
-                if variable not in VARIABLES:
+                if variable not in self.variables:
                     address = convert_to_binary(int(variable, 16), 8)
                 else:
-                    address = VARIABLES[variable]
+                    address = self.variables[variable]
                 binary = opcode + register_a + address
             elif instruction in ('loadrind', 'storerind', 'not', 'neg'):
                 if len(inst) != 3:
@@ -326,8 +290,49 @@ class Assembler:
                 if len(inst) != 1:
                     raise SyntaxError(error)
                 binary = opcode + '00000000000'
-            RAM[self.p_counter] = binary[0:8]
-            RAM[self.p_counter + 1] = binary[8:]
+            self.binary_ram[self.p_counter] = binary[0:8]
+            self.binary_ram[self.p_counter + 1] = binary[8:]
+
+    def verify_ram_content(self):
+        """
+        Verifies assembled memory is in binary format. If not will do the necessary changes to achieve this
+        """
+        i = 0
+        for num in range(2048):
+            if self.binary_ram[i] in ('jmprind', 'jcondrin'):
+                opcode = OPCODE[self.binary_ram[i]]
+                register_a = convert_to_binary(int(self.binary_ram[i + 1][1]), 3)
+                binary = opcode + register_a + '00000000'
+                self.binary_ram[i] = binary[0:8]
+                self.binary_ram[i + 1] = binary[8:]
+            elif self.binary_ram[i] in ('jmpaddr', 'jcondaddr', 'call'):
+                opcode = OPCODE[self.binary_ram[i]]
+                if self.binary_ram[i + 1] not in self.variables:
+                    if re.match(r'^[A-Za-z][A-Za-z0-9]*$', self.binary_ram[i + 1]):
+                        raise SyntaxError(f'Invalid label {self.binary_ram[i + 1]}. Please input a valid and defined label.')
+                    elif not re.match(r'^[0-9]+$', self.binary_ram[i + 1]):
+                        raise SyntaxError(f'Invalid label {self.binary_ram[i + 1]}. Labels must start with letters!! Please input a valid and defined label.')
+                    address = f'{int(self.binary_ram[i + 1], 16):011b}'
+                else:
+
+                    address = self.variables[self.binary_ram[i + 1]]
+                binary = opcode + address if len(address) == 11 else address
+                self.binary_ram[i] = binary[0:8]
+                self.binary_ram[i + 1] = binary[8:]
+            i += 2
+
+    def hexify_ram_content(self):
+        """
+        Converts assembled binary content into ram bytes
+        """
+        i = 0
+        while i < len(self.ram):
+            try:
+                self.ram[i] = int(self.binary_ram[i], 2)
+            except ValueError:
+                raise SyntaxError(f"Invalid content at address {i:03X}: '{self.binary_ram[i]}'. "
+                                  f"An operand does not fit in its instruction field") from None
+            i += 1
 
     def correct_p_counter(self):
         """
@@ -0,0 +1,147 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from assembler import Assembler
+from microprocessor_simulator import ERROR, MicroSim, get_decode_table
+
+PROGRAM_EXTENSIONS = ('.asm', '.obj')
+# Raised by the assembler and read_obj_file for a program they cannot load, as caught by the GUI
+LOAD_ERRORS = (AssertionError, FileNotFoundError, ValueError, MemoryError, KeyError, SyntaxError)
+
+
+def find_programs(paths):
+    """
+    Lists the .asm and .obj files given directly or found inside the given directories
+    :param paths: list of str
+    :return: list of str
+    """
+    programs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                programs.extend(os.path.join(root, name) for name in sorted(files)
+                                if name.endswith(PROGRAM_EXTENSIONS))
+        else:
+            programs.append(path)
+    return programs
+
+
+def assemble(filename):
+    """
+    Assembles an .asm file
+    :param filename: str
+    :return: Assembler holding the assembled memory and labels
+    """
+    asm = Assembler(filename=filename)
+    asm.read_source()
+    asm.store_instructions_in_ram()
+    asm.verify_ram_content()
+    asm.hexify_ram_content()
+    return asm
+
+
+def run_program(filename, max_steps=1000000, timeout=5, compiled=False, profile=False):
+    """
+    Assembles if needed and runs a program
+    :param filename: str .asm or .obj file
+    :param max_steps: int
+    :param timeout: float seconds
+    :param compiled: bool
+    :param profile: bool add a report of the most executed instructions, see MicroSim.enable_profile
+    :return: dict result, see main
+    """
+    result = {'file': filename}
+    labels = None
+    try:
+        if filename.endswith('.asm'):
+            asm = assemble(filename)
+            micro_sim = MicroSim(ram=asm.ram)
+            labels = asm.variables
+        else:
+            micro_sim = MicroSim()
+            micro_sim.read_obj_file(filename)
+    except Exception as e:
+        result.update(status=ERROR, stage='assemble', error=f'{type(e).__name__}: {e}')
+        return result
+
+    if profile:
+        micro_sim.enable_profile()
+    run = micro_sim.run(max_steps, timeout, compiled=compiled)
+    result.update(status=run.reason, steps=run.steps)
+    if run.period:
+        result.update(period=run.period)
+    if run.error:
+        result.update(stage='run', error=f'{type(run.error).__name__}: {run.error}')
+    result.update(registers=dict(micro_sim.registers),
+                  ram_sha256=hashlib.sha256(micro_sim.ram).hexdigest())
+    if profile:
+        result.update(profile=micro_sim.profile_report(labels))
+    return result
+
+
+def run_batch(programs, output, workers=None, **kwargs):
+    """
+    Runs programs across a process pool, writing one JSON line per program in input order
+    as soon as it is available
+    :param programs: list of str
+    :param output: file
+    :param workers: int processes, defaults to the number of cores
+    :param kwargs: run_program options
+    :return: int number of programs that ended in an error
+    """
+    # Forked workers inherit the decode table instead of loading it again.
+    get_decode_table()
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(programs) // (workers * 4)))
+    errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        options = [kwargs] * len(programs)
+        for result in executor.map(run_with_options, programs, options, chunksize=chunksize):
+            errors += result['status'] == ERROR
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    return errors
+
+
+def run_with_options(filename, options):
+    """
+    Picklable adapter for ProcessPoolExecutor.map
+    :param filename: str
+    :param options: dict
+    :return: dict
+    """
+    return run_program(filename, **options)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Assembles and runs .asm/.obj programs in parallel. Writes a JSON line per program with '
+                    'its status (halt, budget, timeout, cycle or error), steps, registers and a SHA-256 of RAM.')
+    parser.add_argument('paths', nargs='+', help='programs or directories containing them')
+    parser.add_argument('-o', '--output', help='JSON Lines file, defaults to standard output')
+    parser.add_argument('-j', '--workers', type=int, help='worker processes, defaults to the number of cores')
+    parser.add_argument('--max-steps', type=int, default=1000000, help='instruction budget per program')
+    parser.add_argument('--timeout', type=float, default=5, help='seconds allowed per program, 0 for none')
+    parser.add_argument('--compiled', action='store_true', help='run through compiled basic blocks')
+    parser.add_argument('--profile', action='store_true',
+                        help='report the most executed instructions of each program, grouped by label')
+    args = parser.parse_args(args)
+
+    programs = find_programs(args.paths)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        errors = run_batch(programs, output, args.workers, max_steps=args.max_steps,
+                           timeout=args.timeout, compiled=args.compiled, profile=args.profile)
+    finally:
+        if args.output:
+            output.close()
+    print(f'{len(programs)} programs, {errors} errors', file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Performance benchmarks. `python -m benchmarks` runs them all, can save the results as a JSON
+baseline and compare a later run against it, see benchmarks.__main__.
+"""
+
+
+def metric(value, unit, higher_is_better):
+    """
+    :param value: float
+    :param unit: str
+    :param higher_is_better: bool whether a rise is an improvement, as for a rate, or a regression, as for a time
+    :return: dict as stored in a baseline
+    """
+    return {'value': value, 'unit': unit, 'better': 'higher' if higher_is_better else 'lower'}
+
+
+def compare(baseline, results, threshold=0.1):
+    """
+    Finds the metrics that got worse than the baseline by more than a threshold
+    :param baseline: dict metric name -> metric
+    :param results: dict metric name -> metric
+    :param threshold: float relative change tolerated, 0.1 for 10%
+    :return: list of (name, baseline value, value, relative change) tuples, the change being negative when worse
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or not baseline[name]['value']:
+            continue
+        before = baseline[name]['value']
+        change = (result['value'] - before) / before
+        if result['better'] == 'lower':
+            change = -change
+        if change < -threshold:
+            regressions.append((name, before, result['value'], change))
+    return regressions
@@ -0,0 +1,52 @@
+import argparse
+import json
+import platform
+import sys
+
+from benchmarks import bench_assembler, bench_gui, bench_import, bench_simulator, compare
+
+BENCHMARKS = {
+    'assembler': lambda args: bench_assembler.measure(rounds=args.rounds),
+    'simulator': lambda args: bench_simulator.measure(steps=args.steps),
+    'import': lambda args: bench_import.measure(repeat=args.rounds // 2 or 1),
+    'gui': lambda args: bench_gui.measure(repeat=args.rounds),
+}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Runs the benchmarks, saving or comparing against a JSON baseline')
+    parser.add_argument('names', nargs='*', help=f'benchmarks to run among {", ".join(BENCHMARKS)}, defaults to all')
+    parser.add_argument('--save', metavar='FILE', help='writes the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='fails on metrics worse than this baseline')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change tolerated, 0.1 for 10%%')
+    parser.add_argument('--rounds', type=int, default=20, help='repetitions of the shorter benchmarks')
+    parser.add_argument('--steps', type=int, default=200000, help='instructions executed per program')
+    args = parser.parse_args(args)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name}')
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results.update(BENCHMARKS[name](args))
+    for name, result in results.items():
+        print(f'{name:<32} {result["value"]:16,.2f} {result["unit"]}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'metrics': results},
+                      file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['metrics']
+        regressions = compare(baseline, results, args.threshold)
+        for name, before, after, change in regressions:
+            print(f'Regression: {name} {before:,.2f} -> {after:,.2f} ({change:+.1%})')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import argparse
+import glob
+import sys
+import time
+
+from batch import assemble
+from benchmarks import metric
+
+PROGRAMS = 'input/*.asm'
+
+
+def measure(programs=PROGRAMS, rounds=20):
+    """
+    Measures assembly throughput over the programs of the corpus that assemble
+    :param programs: str glob of .asm files
+    :param rounds: int times each program is assembled
+    :return: dict metric name -> metric
+    """
+    filenames = []
+    lines = 0
+    for filename in sorted(glob.glob(programs)):
+        try:
+            assemble(filename)
+        except Exception:  # The corpus includes programs testing assembler errors
+            continue
+        filenames.append(filename)
+        with open(filename) as file:
+            lines += len(file.readlines())
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for filename in filenames:
+            assemble(filename)
+    elapsed = time.perf_counter() - start
+    return {'assembler_lines': metric(lines * rounds / elapsed, 'lines/s', True)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measures assembled lines per second')
+    parser.add_argument('--programs', default=PROGRAMS, help='glob of .asm programs to assemble')
+    parser.add_argument('--rounds', type=int, default=20, help='times each program is assembled')
+    args = parser.parse_args(args)
+
+    for name, result in measure(args.programs, args.rounds).items():
+        print(f'{name:<32} {result["value"]:14,.0f} {result["unit"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import argparse
+import contextlib
+import importlib.abc
+import importlib.machinery
+import random
+import sys
+import time
+import types
+
+from benchmarks import metric
+
+# Packages replaced by stubs, so the tables can be measured without a display or Kivy installed
+STUBBED = ('kivy', 'kivymd', 'pygments')
+
+
+class StubType(type):
+    def __getattr__(cls, name):
+        return Stub()
+
+
+class Stub(metaclass=StubType):
+    """Stands in for every class and object of a stubbed package: accepts any arguments, ignores calls"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        # Lists of widgets, and RecycleView data
+        if name in ('children', 'data'):
+            value = [Stub()] if name == 'children' else []
+            setattr(self, name, value)
+            return value
+        return Stub()
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def stub_attribute(name):
+    """
+    :param name: str attribute of a stubbed module
+    :return: obj standing in for it. Properties give their default value, metrics their argument.
+    """
+    if name == 'ListProperty':
+        return lambda default=None, **kwargs: list(default or [])
+    if name in ('NumericProperty', 'dp', 'sp'):
+        return lambda value=0, **kwargs: value
+    return Stub
+
+
+class StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Imports a stub module for every module of the stubbed packages"""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split('.')[0] in STUBBED:
+            return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        module = types.ModuleType(spec.name)
+        module.__path__ = []
+        module.__getattr__ = stub_attribute
+        return module
+
+    def exec_module(self, module):
+        pass
+
+
+@contextlib.contextmanager
+def stubbed_window():
+    """
+    Imports GUI.window with the stubbed packages. Real ones already imported are kept. The modules
+    imported are removed on exit, so later imports in the process get the real packages.
+    :return: context manager giving the module
+    """
+    modules = dict(sys.modules)
+    finder = StubFinder()
+    sys.meta_path.insert(0, finder)
+    try:
+        import GUI.window
+        sys.meta_path.remove(finder)
+        yield GUI.window
+    finally:
+        if finder in sys.meta_path:
+            sys.meta_path.remove(finder)
+        for name in set(sys.modules).difference(modules):
+            del sys.modules[name]
+            parent, _, child = name.rpartition('.')
+            if parent in modules and getattr(modules[parent], child, None) is not None:
+                delattr(modules[parent], child)
+
+
+def timed(function, repeat):
+    """
+    :param function: function taking no argument
+    :param repeat: int calls
+    :return: float seconds per call
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(repeat=20):
+    """
+    Measures the table refreshes made while a program runs
+    :param repeat: int calls of each
+    :return: dict metric name -> metric
+    """
+    with stubbed_window() as window:
+        return measure_tables(window, repeat)
+
+
+def measure_tables(window, repeat):
+    """
+    :param window: GUI.window module
+    :param repeat: int calls of each
+    :return: dict metric name -> metric
+    """
+    ram = window.RAM
+    mem_table = window.MemoryTable(dpi=96)
+    reg_table = window.RegisterTable(dpi=96)
+    inst_table = window.InstructionTable(dpi=96)
+    mem_table.get_data()
+    generator = random.Random(0)
+
+    def refresh_memory():
+        mem_table.data_list.clear()
+        mem_table.get_data()
+
+    def update_memory():
+        # A frame's worth of writes
+        addresses = generator.sample(range(len(ram)), 16)
+        for address in addresses:
+            ram[address] = generator.randrange(256)
+        mem_table.update_data(sorted(addresses))
+
+    def update_instructions():
+        for address in range(0, 2 * inst_table.history.capacity, 2):
+            inst_table.history.append(address % len(ram), 0x0900 | address & 0xFF)
+        inst_table.update_data()
+
+    try:
+        return {
+            'gui_memory_refresh': metric(timed(refresh_memory, repeat) * 1e3, 'ms', False),
+            'gui_memory_update': metric(timed(update_memory, repeat) * 1e6, 'us', False),
+            'gui_register_refresh': metric(timed(reg_table.get_data, repeat) * 1e6, 'us', False),
+            'gui_instruction_update': metric(timed(update_instructions, repeat) * 1e3, 'ms', False),
+        }
+    finally:
+        window.clear_ram()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measures the GUI table refreshes, with Kivy replaced by stubs')
+    parser.add_argument('--repeat', type=int, default=20, help='calls of each refresh')
+    args = parser.parse_args(args)
+
+    for name, result in measure(args.repeat).items():
+        print(f'{name:<32} {result["value"]:14,.2f} {result["unit"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
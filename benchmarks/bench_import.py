@@ -0,0 +1,65 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import metric
+
+# Modules a headless run needs, and the GUI for comparison
+CORE = 'import semref, batch'
+GUI = 'import GUI.window'
+
+
+def import_time(code, repeat):
+    """
+    Measures the cold import time of a statement in fresh interpreters, less the interpreter startup
+    :param code: str
+    :param repeat: int runs, the median is kept
+    :return: float seconds
+    """
+    def run(statement):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', statement], check=True, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    return run(code) - run('pass')
+
+
+def measure(repeat=10):
+    """
+    Measures the cold import time of the core
+    :param repeat: int runs
+    :return: dict metric name -> metric
+    """
+    return {'import_core': metric(import_time(CORE, repeat) * 1e3, 'ms', False)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measures the cold import time of the core and of the GUI')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per measure')
+    parser.add_argument('--max-ms', type=float, help='fails if the core takes longer to import')
+    args = parser.parse_args(args)
+
+    core = import_time(CORE, args.repeat)
+    print(f'{"core":<8} {core * 1e3:8.1f} ms')
+    try:
+        print(f'{"gui":<8} {import_time(GUI, args.repeat) * 1e3:8.1f} ms')
+    except subprocess.CalledProcessError:
+        print(f'{"gui":<8} skipped: Kivy is not installed')
+
+    code = 'import sys; ' + CORE + '; sys.exit(any(name.split(".")[0] in ("kivy", "kivymd") for name in sys.modules))'
+    if subprocess.run([sys.executable, '-c', code]).returncode:
+        print('The core imports Kivy')
+        return 1
+    if args.max_ms is not None and core * 1e3 > args.max_ms:
+        print(f'The core takes longer than {args.max_ms} ms to import')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
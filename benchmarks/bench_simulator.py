@@ -0,0 +1,88 @@
+import argparse
+import glob
+import sys
+import time
+
+from batch import LOAD_ERRORS
+from benchmarks import metric
+from microprocessor_simulator import ERROR, HALT, MicroSim
+
+PROGRAMS = 'output/sprt5Test*.obj'
+# Programs that fail to load or to run are skipped
+SKIPPED_ERRORS = LOAD_ERRORS + (SystemError, IndexError)
+
+
+def run_program(filename, steps, compiled=False):
+    """
+    Executes a program for a fixed number of instructions, restarting it whenever it halts
+    :param filename: str
+    :param steps: int
+    :param compiled: bool run through compiled blocks instead of the interpreter
+    :return: float seconds spent executing
+    """
+    micro_sim = MicroSim()
+    micro_sim.read_obj_file(filename)
+    elapsed = 0.0
+    executed = 0
+    while executed < steps:
+        start = time.perf_counter()
+        result = micro_sim.run(steps - executed, compiled=compiled, detect_cycles=False)
+        elapsed += time.perf_counter() - start
+        executed += result.steps
+        if result.reason == ERROR:
+            raise result.error
+        if result.reason == HALT:
+            micro_sim.reset()
+    return elapsed
+
+
+def measure(programs=PROGRAMS, steps=200000):
+    """
+    Measures interpreted and compiled throughput over loop-heavy programs
+    :param programs: str glob of .obj files
+    :param steps: int instructions executed per program
+    :return: dict metric name -> metric
+    """
+    results = {}
+    for compiled, name in ((False, 'simulator'), (True, 'simulator_compiled')):
+        total_time = 0.0
+        total_steps = 0
+        for filename in sorted(glob.glob(programs)):
+            try:
+                total_time += run_program(filename, steps, compiled)
+            except SKIPPED_ERRORS:
+                continue
+            total_steps += steps
+        if total_steps:
+            results[name] = metric(total_steps / total_time, 'instructions/s', True)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measures simulated instructions per second')
+    parser.add_argument('--steps', type=int, default=200000, help='instructions executed per program')
+    parser.add_argument('--programs', default=PROGRAMS, help='glob of .obj programs to run')
+    parser.add_argument('--compiled', action='store_true', help='run through compiled basic blocks')
+    args = parser.parse_args(args)
+
+    total_time = 0.0
+    total_steps = 0
+    for filename in sorted(glob.glob(args.programs)):
+        try:
+            elapsed = run_program(filename, args.steps, args.compiled)
+        except SKIPPED_ERRORS as e:
+            print(f'{filename:<32} skipped: {e}')
+            continue
+        total_time += elapsed
+        total_steps += args.steps
+        print(f'{filename:<32} {elapsed * 1e9 / args.steps:8.0f} ns/instruction')
+    if not total_steps:
+        print('No program ran')
+        return 1
+    print(f'{"total":<32} {total_time * 1e9 / total_steps:8.0f} ns/instruction '
+          f'({total_steps / total_time:,.0f} instructions/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
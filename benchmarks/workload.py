@@ -0,0 +1,221 @@
+import argparse
+import random
+import sys
+import time
+
+from batch import assemble
+
+# Memory map of the generated programs. LOAD, STORE and LOOP take 8-bit addresses, so the variables and
+# the loop kernels go in the first 256 bytes. Jump and call targets take 11 bits, so code stays below 800.
+# Bulk data fills the rest up to the last 256 bytes, left to the stack growing down from the end of memory.
+KERNEL_END = 0x100
+CODE_START = 0x100
+CODE_END = 0x800
+DATA_END = 0xF00
+MAX_CALL_DEPTH = 120  # Return addresses fitting in the stack page, leaving room for the kernel calls
+REGISTERS = ('R1', 'R2', 'R3', 'R4', 'R5', 'R6')  # R0 cannot be written and R7 moves the stack pointer
+
+
+class Program:
+    """Assembly source being generated, tracking the address the assembler gives each line"""
+
+    def __init__(self):
+        self.lines = []
+        self.address = 0
+
+    def org(self, address):
+        self.lines.append(f'org {address:X}')
+        self.address = address
+
+    def label(self, name):
+        # Labels and instructions are moved to even addresses, see Assembler.correct_p_counter
+        self.address += self.address % 2
+        self.lines.append(f'{name}:')
+
+    def instruction(self, text):
+        self.address += self.address % 2
+        self.lines.append(f'    {text}')
+        self.address += 2
+
+    def data(self, name, values):
+        self.lines.append(f'{name} db ' + ', '.join(f'{value:02X}' for value in values))
+        self.address += len(values)
+
+
+def generate(seed=0, labels=500, call_depth=32, kernels=4, loop_depth=3, loop_count=4, variables=32,
+             data_bytes=1024, max_db_length=16, segments=8):
+    """
+    Generates a Semref program that assembles, passes verify_indentation and halts when run. The same
+    arguments always give the same program.
+    :param seed: int
+    :param labels: int labelled instructions, spread over the code segments
+    :param call_depth: int nested calls, each function calling the next one
+    :param kernels: int subroutines of nested loops
+    :param loop_depth: int loops nested in each kernel, at most 5
+    :param loop_count: int iterations of each loop, the innermost body runs loop_count ** loop_depth times
+    :param variables: int one-byte variables loaded and stored by the code
+    :param data_bytes: int bytes of bulk db data, one label per db line
+    :param max_db_length: int most bytes per bulk db line
+    :param segments: int org segments the labelled instructions are split in
+    :return: str assembly source
+    """
+    if not 0 <= call_depth <= MAX_CALL_DEPTH:
+        raise ValueError(f'Call depth must be between 0 and {MAX_CALL_DEPTH}')
+    if not 1 <= loop_depth <= len(REGISTERS) - 1 or not 1 <= loop_count <= 0xFF:
+        raise ValueError(f'Loop depth must be between 1 and {len(REGISTERS) - 1}, loop count between 1 and FF')
+    generator = random.Random(seed)
+    program = Program()
+    program.org(0)
+    program.instruction('JMPADDR main')
+    constants = [f'k{index}' for index in range(4)]
+    for name in constants:
+        program.lines.append(f'const {name} {generator.randrange(0x100):X}')
+    names = [f'var{index}' for index in range(variables)]
+    for name in names:
+        program.data(name, [generator.randrange(0x100)])
+
+    for kernel in range(kernels):
+        program.label(f'kern{kernel}')
+        counters = REGISTERS[1:loop_depth + 1]
+        targets = []
+        for register in counters:
+            program.instruction(f'LOADIM {register}, #{loop_count:02X}')
+            # Each loop goes back to the start of the loop it contains
+            targets.append(program.address)
+        program.instruction('ADDIM R1, #01')
+        for register, target in reversed(list(zip(counters, targets))):
+            program.instruction(f'LOOP {register}, {target:X}')
+        program.instruction('RETURN')
+    if program.address > KERNEL_END:
+        raise ValueError(f'Variables and loop kernels take {program.address} bytes, more than {KERNEL_END}')
+
+    program.org(CODE_START)
+    program.label('main')
+    for name in names[:4]:
+        program.instruction(f'LOAD {generator.choice(REGISTERS)}, {name}')
+    if call_depth:
+        program.instruction('CALL fn0')
+    for kernel in range(kernels):
+        program.instruction(f'CALL kern{kernel}')
+    if labels:
+        program.instruction('JMPADDR blk0')
+    program.label('done')
+    program.instruction('JMPADDR done')
+    for depth in range(call_depth):
+        program.label(f'fn{depth}')
+        program.instruction(f'ADDIM {generator.choice(REGISTERS)}, #01')
+        if depth + 1 < call_depth:
+            program.instruction(f'CALL fn{depth + 1}')
+        program.instruction('RETURN')
+
+    segments = min(segments, labels)
+    free = CODE_END - program.address - 2 * (labels + segments)
+    if free < 0:
+        raise ValueError(f'Code takes {CODE_END - free - CODE_START} bytes, more than {CODE_END - CODE_START}')
+    label = 0
+    for segment in range(segments):
+        gap = generator.randrange(free // segments + 1) & ~1
+        program.org(program.address + gap)
+        end = labels * (segment + 1) // segments
+        while label < end:
+            program.label(f'blk{label}')
+            program.instruction(random_instruction(generator, names, constants))
+            label += 1
+        program.instruction(f'JMPADDR blk{label}' if label < labels else 'JMPADDR done')
+
+    if data_bytes > DATA_END - CODE_END:
+        raise ValueError(f'Bulk data must fit in {DATA_END - CODE_END} bytes')
+    program.org(CODE_END)
+    table = 0
+    while data_bytes > 0:
+        length = min(data_bytes, generator.randint(1, max_db_length))
+        program.data(f'tab{table}', [generator.randrange(0x100) for _ in range(length)])
+        data_bytes -= length
+        table += 1
+    return '\n'.join(program.lines) + '\n'
+
+
+def random_instruction(generator, variables, constants):
+    """
+    Picks an instruction that neither jumps nor touches R0, R7 or the code
+    :param generator: random.Random
+    :param variables: list of str one-byte variables
+    :param constants: list of str
+    :return: str
+    """
+    a, b, c = (generator.choice(REGISTERS) for _ in range(3))
+    kind = generator.randrange(8)
+    if kind == 0:
+        return f'{generator.choice(("ADDIM", "SUBIM", "LOADIM"))} {a}, #{generator.randrange(0x100):02X}'
+    if kind == 1:
+        return f'LOADIM {a}, {generator.choice(constants)}'
+    if kind == 2 and variables:
+        return f'LOAD {a}, {generator.choice(variables)}'
+    if kind == 3 and variables:
+        return f'STORE {generator.choice(variables)}, {a}'
+    if kind == 4:
+        return f'{generator.choice(("NOT", "NEG", "GRT", "GRTEQ", "EQ", "NEQ"))} {a}, {b}'
+    if kind == 5:
+        return 'NOP'
+    # No ROTAR or ROTAL: MicroSim.rotl and rotr fail on a rotation by 0, and the count is a register's
+    operation = generator.choice(('ADD', 'SUB', 'AND', 'OR', 'XOR', 'SHIFTR', 'SHIFTL'))
+    return f'{operation} {a}, {b}, {c}'
+
+
+def scaling(filename, seed, sizes):
+    """
+    Prints the time the assembler takes per line as programs grow, a growing time per line showing
+    superlinear behaviour
+    :param filename: str file the programs are written to
+    :param seed: int
+    :param sizes: list of int labelled instructions
+    """
+    for labels in sizes:
+        # Only the labelled instructions and one-byte db lines grow, the calls and kernels would take code space
+        source = generate(seed, labels=labels, call_depth=0, kernels=1, data_bytes=min(2 * labels, DATA_END - CODE_END),
+                          max_db_length=1, segments=1)
+        with open(filename, 'w') as file:
+            file.write(source)
+        lines = source.count('\n')
+        start = time.perf_counter()
+        assemble(filename)
+        elapsed = time.perf_counter() - start
+        print(f'{labels:>6} labels {lines:>6} lines {elapsed * 1e3:10.1f} ms {elapsed * 1e6 / lines:8.1f} us/line')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.workload',
+                                     description='Generates a synthetic Semref program from a seed')
+    parser.add_argument('-o', '--output', help='.asm file, defaults to standard output')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--labels', type=int, default=500, help='labelled instructions')
+    parser.add_argument('--call-depth', type=int, default=32, help='nested calls')
+    parser.add_argument('--kernels', type=int, default=4, help='subroutines of nested loops')
+    parser.add_argument('--loop-depth', type=int, default=3, help='loops nested in each kernel')
+    parser.add_argument('--loop-count', type=int, default=4, help='iterations of each loop')
+    parser.add_argument('--variables', type=int, default=32, help='one-byte variables used by the code')
+    parser.add_argument('--data-bytes', type=int, default=1024, help='bytes of bulk db data')
+    parser.add_argument('--max-db-length', type=int, default=16, help='most bytes per bulk db line')
+    parser.add_argument('--segments', type=int, default=8, help='org segments of labelled instructions')
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='LABELS',
+                        help='instead, times the assembler on programs of these sizes, written to --output')
+    args = parser.parse_args(args)
+
+    try:
+        if args.scaling:
+            scaling(args.output or 'workload.asm', args.seed, args.scaling)
+            return 0
+        source = generate(args.seed, args.labels, args.call_depth, args.kernels, args.loop_depth, args.loop_count,
+                          args.variables, args.data_bytes, args.max_db_length, args.segments)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
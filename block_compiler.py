@@ -0,0 +1,312 @@
+from utils import OPCODE_NAMES
+
+# Instructions that write their register a operand.
+REGISTER_WRITERS = ('load', 'loadim', 'pop', 'loadrind', 'add', 'sub', 'addim', 'subim', 'and', 'or',
+                    'xor', 'not', 'neg', 'shiftr', 'shiftl', 'loop')
+
+# Instructions that end a block. The block function returns the address they transfer control to.
+TERMINATORS = ('jmprind', 'jmpaddr', 'jcondrin', 'jcondaddr', 'loop')
+
+# Instructions always left to the interpreter: call/return can fault on the stack boundary and the
+# rotations fault on a zero width.
+INTERPRETED = ('call', 'return', 'rotar', 'rotal')
+
+# Opcode name -> Python expression computing the value written to register a.
+EXPRESSIONS = {
+    'load': 'ram[{address}]',
+    'loadim': '{address}',
+    'loadrind': 'ram[gpr[{b}]]',
+    'add': '(gpr[{b}] + gpr[{c}]) & 255',
+    'sub': '(gpr[{b}] - gpr[{c}]) & 255',
+    'addim': '(gpr[{a}] + {address}) & 255',
+    'subim': '(gpr[{a}] - {address}) & 255',
+    'and': 'gpr[{b}] & gpr[{c}]',
+    'or': 'gpr[{b}] | gpr[{c}]',
+    'xor': 'gpr[{b}] ^ gpr[{c}]',
+    'not': '-gpr[{b}] & 255',
+    'neg': '255 - gpr[{b}]',
+    'shiftr': 'gpr[{b}] >> gpr[{c}]',
+    'shiftl': '(gpr[{b}] << gpr[{c}]) & 255',
+}
+
+# Opcode name -> Python expression assigned to the cond register.
+CONDITIONS = {
+    'grt': 'int(gpr[{a}] > gpr[{b}])',
+    'grteq': 'int(gpr[{a}] >= gpr[{b}])',
+    'eq': 'int(gpr[{a}] == gpr[{b}])',
+    'neq': 'int(gpr[{a}] != gpr[{b}])',
+}
+
+# (start address, words) -> compiled block code, shared by every compiler so reloading a program is cheap.
+CODE_CACHE = {}
+CODE_CACHE_SIZE = 4096
+
+
+class BlockCompiler:
+    """
+    Translates basic blocks found in RAM into Python functions for MicroSim.run_blocks.
+
+    A block is a run of instructions executed straight through, ending at a jump, a loop or just
+    before an instruction left to the interpreter. Each block function runs its instructions and
+    returns (next program counter, instructions executed). Writes into compiled code invalidate the
+    blocks covering it; a block that writes into code returns right after that write. Writes to a
+    device port notify the device mapped there in the I/O bus table. Every address written is added to
+    the dirty set.
+    """
+    MAX_BLOCK_LENGTH = 64
+
+    def __init__(self, ram, registers, decode_table, devices=None, dirty=None):
+        self.ram = ram
+        self.registers = registers
+        self.decode_table = decode_table
+        # Address -> device handler, see IOBus.devices.
+        self.devices = devices if devices is not None else [None] * len(ram)
+        self.dirty = dirty if dirty is not None else set()  # See MicroSim.dirty.
+        # Start address -> (function, length, halt address, executed words), or None if the
+        # instruction at that address must be interpreted.
+        self.blocks = {}
+        # Address -> number of cached blocks covering that byte.
+        self.code_map = bytearray(len(ram))
+
+    def clear(self):
+        """
+        Drops every compiled block
+        """
+        self.blocks.clear()
+        self.code_map[:] = bytes(len(self.code_map))
+
+    def invalidate(self, address):
+        """
+        Drops the blocks covering a memory address
+        :param address: int
+        """
+        for start, block in list(self.blocks.items()):
+            end = start + 2 * (block[1] if block else 1)
+            if start <= address < end:
+                del self.blocks[start]
+                for i in range(start, end):
+                    self.code_map[i] -= 1
+
+    def invalidate_changed(self, ram):
+        """
+        Drops the blocks whose code differs in another memory image, before it is copied over RAM
+        :param ram: bytes
+        """
+        for start, block in list(self.blocks.items()):
+            end = start + 2 * (block[1] if block else 1)
+            if start in self.blocks and self.ram[start:end] != ram[start:end]:
+                self.invalidate(start)
+
+    def is_interpreted(self, address, word):
+        """
+        Checks if the instruction at an address has to be run by the interpreter
+        :param address: int
+        :param word: int
+        :return: bool
+        """
+        if not word:
+            # A blank word at the last address halts the simulator instead of advancing.
+            return address + 2 >= len(self.ram)
+        opcode, register_a = self.decode_table[word][0:2]
+        name = OPCODE_NAMES[opcode]
+        return name in INTERPRETED or (not register_a and name in REGISTER_WRITERS)
+
+    def get_block(self, start):
+        """
+        Gets the block starting at an address, compiling it if needed
+        :param start: int
+        :return: tuple or None
+        """
+        if start in self.blocks:
+            return self.blocks[start]
+        if start % 2 != 0 or start + 1 >= len(self.ram):
+            return None
+
+        ram = self.ram
+        words = []
+        name = None
+        address = start
+        while address + 1 < len(ram) and len(words) < self.MAX_BLOCK_LENGTH:
+            word = ram[address] << 8 | ram[address + 1]
+            if self.is_interpreted(address, word):
+                break
+            words.append(word)
+            address += 2
+            name = OPCODE_NAMES[self.decode_table[word][0]] if word else 'nop'
+            if name in TERMINATORS:
+                break
+
+        if not words:
+            self.blocks[start] = None
+            self.code_map[start] += 1
+            self.code_map[start + 1] += 1
+            return None
+
+        length = len(words)
+        halt_address = -1
+        if name in TERMINATORS and name != 'loop':
+            # Jumping back onto the jump itself halts the simulator.
+            halt_address = address - 2
+        # A block whose last instruction may jump back to its first one repeats inside its function.
+        target = self.decode_table[words[-1]][4]
+        repeats = name in ('jmpaddr', 'jcondaddr', 'loop') and target == start and halt_address != start
+
+        key = (start, tuple(words))
+        code = CODE_CACHE.get(key)
+        if code is None:
+            lines = []
+            for i, word in enumerate(words):
+                count = f'n + {i + 1}' if repeats else str(i + 1)
+                lines.extend(self.translate(start + 2 * i, word, count))
+            if name not in TERMINATORS:
+                lines.append(f'return {address}, {length}')
+            else:
+                taken, condition, not_taken = self.jump(address - 2, words[-1])
+                if repeats:
+                    lines = self.repeat(lines, length, taken, condition, not_taken)
+                elif not_taken is None:
+                    lines.append(f'return {taken}, {length}')
+                else:
+                    lines.append(f'return ({taken} if {condition} else {not_taken}), {length}')
+            code = self.generate(key, lines)
+        block = (self.build(start, code), length, halt_address, words)
+        self.blocks[start] = block
+        for i in range(start, address):
+            self.code_map[i] += 1
+        return block
+
+    def translate(self, address, word, count):
+        """
+        Translates one instruction into lines of Python
+        :param address: int
+        :param word: int
+        :param count: str expression of the number of instructions executed once this one completes
+        :return: list, without the return of a jump
+        """
+        if not word:
+            return []
+        opcode, a, b, c, value = self.decode_table[word]
+        name = OPCODE_NAMES[opcode]
+        fields = {'a': a, 'b': b, 'c': c, 'address': value}
+        next_address = address + 2
+        code_check = ['mark_dirty(target)',
+                      'device = devices[target]',
+                      'if device is not None:',
+                      '    device(target, ram[target])',
+                      'if code_map[target]:',
+                      '    invalidate(target)',
+                      f'    return {next_address}, {count}']
+
+        if name in EXPRESSIONS:
+            return self.write_register(a, EXPRESSIONS[name].format(**fields))
+        if name in CONDITIONS:
+            return [f'registers.cond = {CONDITIONS[name].format(**fields)}']
+        if name == 'store':
+            return [f'target = {value}', f'ram[target] = gpr[{a}]'] + code_check
+        if name == 'storerind':
+            return [f'target = gpr[{a}]', f'ram[target] = gpr[{b}]'] + code_check
+        if name == 'pop':
+            return (['sp = registers.sp'] + self.write_register(a, 'ram[sp]') +
+                    ['sp += 1',
+                     f'if sp >= {len(self.ram)}:',
+                     f'    sp -= {len(self.ram)}',
+                     'registers.sp = sp',
+                     'gpr[7] = sp & 255'])
+        if name == 'push':
+            return ['target = registers.sp - 1',
+                    'if target < 0:',
+                    f'    target += {len(self.ram)}',
+                    'registers.sp = target',
+                    'gpr[7] = target & 255',
+                    f'ram[target] = gpr[{a}]'] + code_check
+        if name == 'loop':
+            return [f'value = gpr[{a}] - 1',
+                    'if value < 0:',
+                    '    value = 0'] + self.write_register(a, 'value')
+        # nop and the other jumps
+        return []
+
+    def jump(self, address, word):
+        """
+        Gets the Python expressions of a jump
+        :param address: int
+        :param word: int
+        :return: tuple of (target when taken, condition, address when not taken or None)
+        """
+        opcode, a, _, _, value = self.decode_table[word]
+        next_address = address + 2
+        return {
+            'jmpaddr': (str(value), 'True', None),
+            'jmprind': (f'gpr[{a}]', 'True', None),
+            'jcondaddr': (str(value), 'registers.cond', next_address),
+            'jcondrin': (f'gpr[{a}]', 'registers.cond', next_address),
+            'loop': (str(value), 'value', next_address)
+        }[OPCODE_NAMES[opcode]]
+
+    @staticmethod
+    def repeat(lines, length, taken, condition, not_taken):
+        """
+        Wraps the lines of a block ending in a jump to its own start into a loop, left when the jump
+        is not taken or when another pass would exceed the step budget
+        :param lines: list
+        :param length: int
+        :param taken: str
+        :param condition: str
+        :param not_taken: int or None
+        :return: list
+        """
+        loop = ['n = 0', 'while True:'] + [f'    {line}' for line in lines]
+        loop.append(f'    n += {length}')
+        if not_taken is not None:
+            loop.extend([f'    if not ({condition}):', f'        return {not_taken}, n'])
+        loop.extend([f'    if n + {length} > budget:', f'        return {taken}, n'])
+        return loop
+
+    @staticmethod
+    def write_register(index, expression):
+        """
+        Translates a write to a general purpose register. Writing R7 moves the stack pointer.
+        :param index: int
+        :param expression: str
+        :return: list
+        """
+        lines = [f'gpr[{index}] = {expression}']
+        if index == 7:
+            lines.append('registers.sp = gpr[7]')
+        return lines
+
+    @staticmethod
+    def generate(key, lines):
+        """
+        Compiles the Python function definition of a block and caches it
+        :param key: tuple of (start address, words)
+        :param lines: list
+        :return: code
+        """
+        start = key[0]
+        body = '\n'.join(f'    {line}' for line in lines)
+        source = (f'def block_{start:03x}(budget, gpr=gpr, ram=ram, registers=registers, code_map=code_map, '
+                  f'invalidate=invalidate, devices=devices, mark_dirty=mark_dirty):\n{body}\n')
+        if len(CODE_CACHE) >= CODE_CACHE_SIZE:
+            CODE_CACHE.clear()
+        code = CODE_CACHE[key] = compile(source, f'<block {start:03x}>', 'exec')
+        return code
+
+    def build(self, start, code):
+        """
+        Builds the Python function of a block, bound to this compiler's RAM, registers, devices and dirty set
+        :param start: int
+        :param code: code returned by generate
+        :return: function
+        """
+        namespace = {
+            'gpr': self.registers.gpr,
+            'ram': self.ram,
+            'registers': self.registers,
+            'code_map': self.code_map,
+            'invalidate': self.invalidate,
+            'devices': self.devices,
+            'mark_dirty': self.dirty.add
+        }
+        exec(code, namespace)
+        return namespace[f'block_{start:03x}']
@@ -0,0 +1,74 @@
+from array import array
+
+
+class InstructionHistory:
+    """
+    Fixed-capacity record of executed instructions, dropping the oldest once full.
+    Addresses and instruction words are kept in two preallocated arrays used as a ring buffer,
+    so recording costs the same however long a program runs. Text is only made for the rows shown.
+    """
+    __slots__ = ('capacity', 'addresses', 'words', 'start', 'length', 'total')
+
+    def __init__(self, capacity=1000):
+        """
+        :param capacity: int most instructions kept
+        """
+        self.capacity = capacity
+        self.addresses = array('H', bytes(2 * capacity))
+        self.words = array('H', bytes(2 * capacity))
+        self.start = 0  # Index of the oldest instruction kept
+        self.length = 0
+        # Instructions appended minus the ones popped, including the ones dropped. Lets a view find the
+        # rows added or removed since it last looked.
+        self.total = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        """
+        :param index: int position from the oldest instruction kept, negative from the newest
+        :return: tuple of (address, word)
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('history index out of range')
+        index = (self.start + index) % self.capacity
+        return self.addresses[index], self.words[index]
+
+    def append(self, address, word):
+        """
+        Records an instruction, dropping the oldest if full
+        :param address: int
+        :param word: int
+        """
+        end = self.start + self.length
+        if end >= self.capacity:
+            end -= self.capacity
+        self.addresses[end] = address
+        self.words[end] = word
+        if self.length < self.capacity:
+            self.length += 1
+        else:
+            self.start = end + 1 if end + 1 < self.capacity else 0
+        self.total += 1
+
+    def pop(self):
+        """
+        Removes the newest instruction
+        :return: tuple of (address, word)
+        """
+        row = self[-1]
+        self.length -= 1
+        self.total -= 1
+        return row
+
+    def clear(self):
+        """
+        Removes every instruction
+        """
+        self.start = 0
+        self.length = 0
+        self.total = 0
+
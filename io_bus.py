@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import deque
+
+from utils import RAM_SIZE
+
+
+class IOBus:
+    """
+    Memory-mapped I/O bus. Maps each memory address to the device handler notified when the simulator
+    writes that address, so devices are refreshed per write to their port instead of polling RAM.
+    """
+
+    def __init__(self, size=RAM_SIZE):
+        """
+        :param size: int number of addresses
+        """
+        # Address -> handler taking (address, value) called after the simulator writes the address, or None.
+        self.devices = [None] * size
+        # Handlers left out of refresh, such as input devices listening for the program's writes
+        self.listeners = set()
+
+    def attach(self, port, handler, length=1, refresh=True):
+        """
+        Maps ports to a device handler, replacing the handler previously mapped to them
+        :param port: int first address
+        :param handler: function taking (address, value)
+        :param length: int number of consecutive addresses
+        :param refresh: bool whether refresh notifies the handler. False for a device that only listens for
+        the program's writes, such as an input device, since refresh does not come from the program.
+        """
+        if port < 0 or port + length > len(self.devices):
+            raise ValueError(f'Invalid port {port}')
+        for address in range(port, port + length):
+            self.devices[address] = handler
+        if not refresh:
+            self.listeners.add(handler)
+
+    def detach(self, handler):
+        """
+        Removes a device handler from every port it is mapped to
+        :param handler: function
+        """
+        for address, device in enumerate(self.devices):
+            if device == handler:
+                self.devices[address] = None
+        self.listeners.discard(handler)
+
+    def clear(self):
+        """
+        Removes every device handler
+        """
+        self.devices[:] = [None] * len(self.devices)
+        self.listeners.clear()
+
+    def write(self, ram, address, value):
+        """
+        Writes memory from outside the simulator, such as an input device, notifying the device mapped there
+        :param ram: bytearray
+        :param address: int
+        :param value: int
+        """
+        ram[address] = value
+        device = self.devices[address]
+        if device is not None:
+            device(address, value)
+
+    def refresh(self, ram):
+        """
+        Notifies every device of the current content of its ports, after memory changed without going
+        through the bus, such as a file load or a reset. Devices attached with refresh False are skipped.
+        :param ram: bytearray
+        """
+        listeners = self.listeners
+        for address, device in enumerate(self.devices):
+            if device is not None and device not in listeners:
+                device(address, ram[address])
+
+
+class CoalescingScheduler:
+    """
+    Collects device port writes from any thread until a UI frame applies them with flush. Writes to a
+    port within a frame are merged, keeping the last value, so each device repaints once per frame
+    however often the program writes it.
+    """
+
+    def __init__(self):
+        # (handler, key) -> (address, value) of the last write not flushed yet
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.writes = 0  # Writes received
+        self.flushed = 0  # Writes applied, the rest were merged
+
+    def wrap(self, handler, key=None):
+        """
+        Makes the function to attach to an IOBus in place of a device handler
+        :param handler: function taking (address, value), called on flush
+        :param key: function taking (address, value) returning which writes are merged, by default the ones
+        to the same address. A device multiplexing a port, such as the seven segment display picking a
+        digit with a bit, keys its writes by that bit so one digit does not hide the other.
+        :return: function taking (address, value)
+        """
+        pending = self.pending
+        lock = self.lock
+
+        def write(address, value):
+            with lock:
+                pending[handler, address if key is None else key(address, value)] = (address, value)
+                self.writes += 1
+        return write
+
+    def flush(self):
+        """
+        Applies the writes collected since the previous flush, on the calling thread
+        :return: int handler calls made
+        """
+        with self.lock:
+            writes = list(self.pending.items())
+            self.pending.clear()
+            self.flushed += len(writes)
+        for (handler, _), (address, value) in writes:
+            handler(address, value)
+        return len(writes)
+
+    def clear(self):
+        """
+        Drops the writes collected
+        """
+        with self.lock:
+            self.pending.clear()
+
+
+class KeyboardInput:
+    """
+    Input device pipeline. Keys pressed are queued and a single long-lived thread writes them one at a
+    time to the device port, each one as soon as the program consumed the previous one. The program
+    consumes a key by writing the port with any value, such as clearing it, which the thread hears of
+    through the I/O bus. Given a hold time, a key still in the port after hold seconds is replaced anyway and counted
+    as dropped.
+    """
+
+    def __init__(self, write, port, maxsize=16, hold=None, on_write=None):
+        """
+        :param write: function taking (address, value) writing memory, such as MicroSim.write_memory
+        :param port: int address written
+        :param maxsize: int most keys waiting, more are dropped
+        :param hold: float most seconds a key waits to be consumed, None to wait until it is
+        :param on_write: function taking (address, value) called on the thread after each key written.
+        It runs while the pipeline is locked, so it must return quickly.
+        """
+        self.write = write
+        self.port = port
+        self.maxsize = maxsize
+        self.hold = hold
+        self.on_write = on_write
+        self.keys = deque()
+        self.condition = threading.Condition()
+        self.pending = None  # Key written and not consumed yet
+        self.consumed = True  # Whether the program wrote the port since the pending key was written
+        self.written_at = 0.0  # Time the pending key was written
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+        self.thread = None
+
+    def depth(self):
+        """
+        :return: int keys waiting to be written
+        """
+        return len(self.keys)
+
+    def press(self, value):
+        """
+        Queues a key
+        :param value: int byte to write to the port
+        :return: bool False if the queue is full and the key was dropped
+        """
+        with self.condition:
+            if len(self.keys) >= self.maxsize:
+                self.dropped += 1
+                return False
+            self.keys.append(value)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='semref-keyboard', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return True
+
+    def port_written(self, address, value):
+        """
+        Marks the pending key consumed when the program writes the port, see IOBus. Attach it with refresh
+        False, since a refresh is not the program writing. Whatever the value
+        written, so a program clearing the port after key 0 or writing the key back consumes it too.
+        :param address: int
+        :param value: int
+        """
+        with self.condition:
+            self.consumed = True
+            self.condition.notify()
+
+    def reset(self):
+        """
+        Forgets the key in the port, such as after memory is cleared, so the next key waiting is written
+        """
+        with self.condition:
+            self.pending = None
+            self.consumed = True
+            self.condition.notify()
+
+    def close(self):
+        """
+        Stops the thread, dropping the keys waiting
+        """
+        with self.condition:
+            self.closed = True
+            self.keys.clear()
+            self.pending = None
+            self.consumed = True
+            self.condition.notify()
+
+    def run(self):
+        """
+        Writes the queued keys to the port until closed
+        """
+        condition = self.condition
+        with condition:
+            while not self.closed:
+                if not self.keys:
+                    condition.wait()
+                    continue
+                if self.pending is not None and not self.consumed:
+                    if self.hold is None:
+                        condition.wait()
+                        continue
+                    remaining = self.written_at + self.hold - time.perf_counter()
+                    if remaining > 0:
+                        condition.wait(remaining)
+                        continue
+                    # Overwritten before the program consumed it
+                    self.dropped += 1
+                value = self.keys.popleft()
+                self.write(self.port, value)
+                self.pending = value
+                self.consumed = False
+                self.written_at = time.perf_counter()
+                self.written += 1
+                if self.on_write is not None:
+                    self.on_write(self.port, value)
@@ -1,33 +1,330 @@
-import re
+import marshal
+import os
+import sys
 import time
+from collections import deque
 
-from utils import (FORMAT_1_OPCODE, FORMAT_2_OPCODE, FORMAT_3_OPCODE, OPCODE,
-                   REGISTER, clear_registers, convert_to_hex, hex_to_binary, RAM, load_ram, is_valid_file, clear_ram)
+from block_compiler import BlockCompiler
+from io_bus import IOBus
+from utils import (FORMAT_2_OPCODE, FORMAT_3_OPCODE, OPCODE_NAMES, RAM_SIZE, RegisterFile,
+                   device_ports, load_ram, is_valid_file)
 
+# Opcode number -> mask of the address/constant field. Format 2 carries 8 bits, format 3 carries 11.
+ADDRESS_MASKS = [0x7FF if name in FORMAT_3_OPCODE else 0xFF if name in FORMAT_2_OPCODE else 0
+                 for name in OPCODE_NAMES]
 
-def get_opcode_key(val):
+# Opcode number -> disassembly template filled with (name, register a, register b, register c, address).
+DISASSEMBLY_FORMATS = []
+for _name in OPCODE_NAMES:
+    if _name in ('nop', 'return'):
+        _template = '{0}'
+    elif _name in ('jmprind', 'jcondrin', 'pop', 'push'):
+        _template = '{0} R{1}'
+    elif _name in ('loadrind', 'storerind', 'not', 'neg', 'grt', 'grteq', 'eq', 'neq'):
+        _template = '{0} R{1}, R{2}'
+    elif _name in ('loadim', 'addim', 'subim'):
+        _template = '{0} R{1}, #{4:02x}'
+    elif _name == 'store':
+        _template = '{0} {4:02x}, R{1}'
+    elif _name in ('load', 'loop'):
+        _template = '{0} R{1}, {4:02x}'
+    elif _name in FORMAT_3_OPCODE:
+        _template = '{0} {4:02x}'
+    else:
+        _template = '{0} R{1}, R{2}, R{3}'
+    DISASSEMBLY_FORMATS.append(_template)
+
+CALL_OPCODE = OPCODE_NAMES.index('call')
+STORE_OPCODE = OPCODE_NAMES.index('store')
+STORERIND_OPCODE = OPCODE_NAMES.index('storerind')
+PUSH_OPCODE = OPCODE_NAMES.index('push')
+NOP_OPCODE = OPCODE_NAMES.index('nop')
+JCONDRIN_OPCODE = OPCODE_NAMES.index('jcondrin')
+JCONDADDR_OPCODE = OPCODE_NAMES.index('jcondaddr')
+LOOP_OPCODE = OPCODE_NAMES.index('loop')
+
+# Most instructions a compiled block may run per call when run_blocks has no step limit.
+BLOCK_BUDGET = 1 << 16
+
+# Instructions run_steps executes between two CycleDetector checks.
+CYCLE_CHECK_INTERVAL = 64
+
+# MicroSim.run stop reasons.
+HALT = 'halt'
+BUDGET = 'budget'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+CYCLE = 'cycle'
+BREAKPOINT = 'breakpoint'
+READ = 'read'  # Read watchpoint
+WRITE = 'write'  # Write watchpoint
+STOPPED = 'stopped'  # Stopped from another thread, see worker.SimulationWorker
+
+# MicroSim.watchpoints flags.
+WATCH_READ = 1
+WATCH_WRITE = 2
+
+# Instruction word -> decode(word). Built lazily by get_decode_table.
+DECODE_TABLE = None
+
+
+def decode(word):
+    """
+    Splits an instruction word into opcode, register a, register b, register c and address/constant
+    :param word: int
+    :return: tuple
+    """
+    opcode = word >> 11
+    return opcode, word >> 8 & 7, word >> 5 & 7, word >> 2 & 7, word & ADDRESS_MASKS[opcode]
+
+
+def decode_table_path():
+    """
+    Gets the location of the on-disk decode table cache. SEMREF_CACHE overrides the directory.
+    :return: str
+    """
+    directory = os.environ.get('SEMREF_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'semref'))
+    return os.path.join(directory, f'decode-v{marshal.version}.marshal')
+
+
+def get_decode_table():
+    """
+    Gets the table of decoded fields for every 16-bit instruction word.
+    Built on first use and cached on disk so later processes only have to load it.
+    :return: tuple
+    """
+    global DECODE_TABLE
+    if DECODE_TABLE is None:
+        path = decode_table_path()
+        try:
+            with open(path, 'rb') as file:
+                masks, table = marshal.loads(file.read())
+            if masks != tuple(ADDRESS_MASKS) or len(table) != 65536:
+                raise ValueError('Stale decode table')
+        except (OSError, EOFError, ValueError, TypeError):
+            table = tuple(decode(word) for word in range(65536))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f'{path}.{os.getpid()}', 'wb') as file:
+                    file.write(marshal.dumps((tuple(ADDRESS_MASKS), table)))
+                os.replace(f'{path}.{os.getpid()}', path)
+            except OSError:
+                pass
+        DECODE_TABLE = table
+    return DECODE_TABLE
+
+
+def disassemble(word):
+    """
+    Disassembles an instruction word
+    :param word: int
+    :return: str
+    """
+    opcode, register_a, register_b, register_c, address = get_decode_table()[word]
+    return DISASSEMBLY_FORMATS[opcode].format(OPCODE_NAMES[opcode], register_a, register_b,
+                                              register_c, address).upper()
+
+
+class RunResult:
+    """Outcome of MicroSim.run"""
+    __slots__ = ('reason', 'steps', 'error', 'period', 'address')
+
+    def __init__(self, reason, steps, error=None, period=0, address=None):
+        """
+        :param reason: str HALT, BUDGET, TIMEOUT, ERROR, CYCLE, BREAKPOINT, READ, WRITE or STOPPED
+        :param steps: int number of instructions executed
+        :param error: Exception raised by the failing instruction, if any
+        :param period: int instructions between two identical states of the infinite loop found, if any
+        :param address: int breakpoint or watched memory address that stopped the run, if any
+        """
+        self.reason = reason
+        self.steps = steps
+        self.error = error
+        self.period = period
+        self.address = address
+
+    def __repr__(self):
+        error = f', error={self.error!r}' if self.error else ''
+        period = f', period={self.period}' if self.period else ''
+        address = f', address={self.address:#05x}' if self.address is not None else ''
+        return f'RunResult(reason={self.reason!r}, steps={self.steps}{error}{period}{address})'
+
+
+class CycleDetector:
+    """
+    Detects infinite loops by finding a machine state that repeats itself.
+
+    Follows Brent's algorithm: the state at check 1, 2, 4, 8... is kept as a checkpoint and later
+    states are compared against it, so a loop is reported a few iterations after it starts. States
+    are only compared in full when the program counter is back at the checkpoint's. The simulator
+    must not receive input from outside (such as the hex keyboard) while it is watched, since an
+    input could break the loop.
+    """
+    __slots__ = ('micro_sim', 'origin', 'program_counter', 'next_checkpoint', 'checkpoint', 'period')
+
+    def __init__(self, micro_sim):
+        """
+        :param micro_sim: MicroSim
+        """
+        self.micro_sim = micro_sim
+        self.origin = micro_sim.counter
+        self.program_counter = -1  # Program counter of the checkpoint.
+        self.next_checkpoint = self.origin + 1  # Instruction count at which the next checkpoint is taken.
+        self.checkpoint = None
+        self.period = 0
+
+    def check(self, counter):
+        """
+        Checks the current state
+        :param counter: int instructions executed, in MicroSim.counter terms
+        :return: bool True once a repeated state is found
+        """
+        micro_sim = self.micro_sim
+        registers = micro_sim.registers
+        if micro_sim.program_counter == self.program_counter:
+            start, gpr, stack_pointer, cond, ram = self.checkpoint
+            if (registers.gpr == gpr and registers.sp == stack_pointer and registers.cond == cond and
+                    micro_sim.ram == ram):
+                self.period = counter - start
+                return True
+        if counter >= self.next_checkpoint:
+            self.program_counter = micro_sim.program_counter
+            self.checkpoint = (counter, registers.gpr[:], registers.sp, registers.cond, bytes(micro_sim.ram))
+            self.next_checkpoint = 2 * counter - self.origin
+        return False
+
+
+class Snapshot:
+    """Copy of a MicroSim machine state, see MicroSim.snapshot"""
+    __slots__ = ('ram', 'registers', 'ports', 'program_counter', 'prev_program_counter', 'is_running')
+
+    def __init__(self, ram, registers, ports, program_counter, prev_program_counter, is_running):
+        """
+        :param ram: bytes
+        :param registers: tuple of (general purpose registers, pc, sp, ir, cond)
+        :param ports: tuple of (device, port) pairs
+        :param program_counter: int
+        :param prev_program_counter: int
+        :param is_running: bool
+        """
+        self.ram = ram
+        self.registers = registers
+        self.ports = ports
+        self.program_counter = program_counter
+        self.prev_program_counter = prev_program_counter
+        self.is_running = is_running
+
+
+class Profile:
     """
-    Gets the opcode for the given value
+    Execution counts recorded by MicroSim.enable_profile, in lists preallocated to the address space
+    so each instruction only increments a few entries
     """
-    for key, value in OPCODE.items():
-        if val == value:
-            return key
-    return None
+    __slots__ = ('executions', 'opcodes', 'taken', 'not_taken')
+
+    def __init__(self, size=RAM_SIZE):
+        """
+        :param size: int number of addresses
+        """
+        self.executions = [0] * size  # Address -> times the instruction there was run.
+        self.opcodes = [0] * len(OPCODE_NAMES)  # Opcode number -> times run. Blank words count as nop.
+        self.taken = [0] * size  # Address -> times the jcondaddr, jcondrin or loop there jumped.
+        self.not_taken = [0] * size  # Address -> times it fell through.
+
+    def total(self):
+        """
+        Gets the number of instructions recorded
+        :return: int
+        """
+        return sum(self.opcodes)
+
+    def hottest(self, top=10):
+        """
+        Gets the most executed addresses
+        :param top: int
+        :return: list of (address, count), most executed first
+        """
+        counts = [(count, address) for address, count in enumerate(self.executions) if count]
+        counts.sort(key=lambda item: (-item[0], item[1]))
+        return [(address, count) for count, address in counts[:top]]
+
+    def report(self, ram, labels=None, top=10):
+        """
+        Formats the hottest addresses with their disassembly, grouped under the closest label at or before
+        each address
+        :param ram: bytearray memory the profiled program ran from
+        :param labels: dict label -> address as int or binary str, such as Assembler.variables
+        :param top: int number of addresses listed
+        :return: str
+        """
+        total = self.total()
+        if not total:
+            return 'No instructions profiled.'
+        starts = sorted((int(address, 2) if isinstance(address, str) else address, label)
+                        for label, address in (labels or {}).items())
+        groups = {}
+        for address, count in self.hottest(top):
+            label = ''
+            for start, name in starts:
+                if start > address:
+                    break
+                label = name
+            groups.setdefault(label, []).append((address, count))
+
+        lines = [f'{total} instructions']
+        for label, entries in sorted(groups.items(), key=lambda item: -sum(count for _, count in item[1])):
+            group_count = sum(count for _, count in entries)
+            lines.append(f'{label or "(no label)"}: {group_count} ({100 * group_count / total:.1f}%)')
+            for address, count in entries:
+                word = ram[address] << 8 | ram[address + 1]
+                line = f'  {address:03X}  {count:>10}  {100 * count / total:5.1f}%  {disassemble(word):<20}'
+                if self.taken[address] or self.not_taken[address]:
+                    line += f'taken {self.taken[address]}, not taken {self.not_taken[address]}'
+                lines.append(line.rstrip())
+        return '\n'.join(lines)
 
 
 class MicroSim:
     """Microprocessor simulator"""
 
     def __init__(self, *args, **kwargs):
+        # Machine state. The GUI passes the shared utils.RAM and utils.REGISTER.
+        self.ram = kwargs.pop('ram', None)
+        self.registers = kwargs.pop('registers', None)
+        self.ports = kwargs.pop('ports', None)  # I/O device name -> port, see utils.device_ports
+        self.bus = kwargs.pop('bus', None)  # Devices notified of writes to their ports
         super().__init__(*args, **kwargs)
+        if self.ram is None:
+            self.ram = bytearray(RAM_SIZE)
+        if self.registers is None:
+            self.registers = RegisterFile()
+        if self.ports is None:
+            self.ports = device_ports()
+        if self.bus is None:
+            self.bus = IOBus(len(self.ram))
+        # Address -> 1 where execution stops once the program counter reaches it, see set_breakpoint.
+        # The spare entries cover the program counter a return can leave past the end of memory.
+        self.breakpoints = bytearray(len(self.ram) + 2)
+        # Address -> WATCH_READ and WATCH_WRITE flags of the accesses that stop execution, see set_watchpoint.
+        self.watchpoints = bytearray(len(self.ram))
+        self.stopped_at = None  # (BREAKPOINT, READ or WRITE, address) of the last breakpoint or watchpoint hit.
+        self.dirty = set()  # Addresses written by instructions or step_back since the last take_dirty.
         self.is_ram_loaded = False
         self.decoded_micro_instructions = []
         self.program_counter = 0
         self.is_running = False
         self.prev_program_counter = -1
+        # Instructions executed by run_steps and run_blocks since the last reset.
         self.counter = 0
         self.filename = ''
         self.error = ''
+        # Opcode number -> bound handler taking (register a, register b, register c, address).
+        self.handlers = [getattr(self, f'_op_{name}') for name in OPCODE_NAMES]
+        self.decode_table = get_decode_table()
+        self.block_compiler = None
+        self.loaded_image = None  # Snapshot taken by read_obj_file, see reset.
+        self.journal = None  # Undo entries of the last instructions, see enable_journal.
+        self.profile = None  # Execution counts, see enable_profile.
 
     def read_obj_file(self, filename):
         """
@@ -40,54 +337,78 @@ class MicroSim:
                 f"Unsupported file '{filename}'. "
                 f"Microprocesor simulator files must be of type 'obj'")
         self.filename = filename
+        self.block_compiler = None
+        self.stopped_at = None
+        self.dirty.clear()
+        if self.journal is not None:
+            self.journal.clear()
 
-        file = open(filename, 'r')
-        lines = file.readlines()
-        load_ram(lines)
+        # Stays False if the file cannot be loaded
+        self.is_ram_loaded = False
+        with open(filename, 'r') as file:
+            lines = file.readlines()
+        load_ram(lines, self.ram)
 
         self.is_ram_loaded = True
         lines.clear()
-        file.close()
+        self.loaded_image = self.snapshot()
 
-    def disassembled_instruction(self):
-        """Disassembles executed assembly instruction"""
-        instruction = hex_to_binary(
-            f'{RAM[self.program_counter]}{RAM[self.program_counter + 1]}')
-        opcode = get_opcode_key(instruction[0:5])
-        if opcode in FORMAT_1_OPCODE:
-            register_a = f'R{int(instruction[5:8], 2)}'
-            register_b = f'R{int(instruction[8:11], 2)}'
-            register_c = f'R{int(instruction[11:14], 2)}'
-            if opcode == 'nop':
-                dis_instruction = f'{opcode}'
-            elif opcode == 'jmprind':
-                dis_instruction = f'{opcode} {register_a}'
-            elif opcode in ('loadrind', 'storerind', 'not', 'neg', 'grt', 'grteq', 'eq', 'neq'):
-                dis_instruction = f'{opcode} {register_a}, {register_b}'
-            else:
-                dis_instruction = f'{opcode} {register_a}, {register_b}, {register_c}'
-        elif opcode in FORMAT_2_OPCODE:
-            register_a = f'R{int(instruction[5:8], 2)}'
-            address_or_const = f'{int(instruction[8:], 2):02x}'
-            if opcode in ('pop', 'push'):
-                dis_instruction = f'{opcode} {register_a}'
-            elif opcode in ('loadim', 'addim', 'subim'):
-                dis_instruction = f'{opcode} {register_a}, #{address_or_const}'
-            elif opcode == 'store':
-                dis_instruction = f'{opcode} {address_or_const}, {register_a}'
-            else:
-                dis_instruction = f'{opcode} {register_a}, {address_or_const}'
-        elif opcode in FORMAT_3_OPCODE:
-            register_a = f'R{int(instruction[5:8], 2)}'
-            address = f'{int(instruction[5:], 2):02x}'
-            if opcode == 'jcondrin':
-                dis_instruction = f'{opcode} {register_a}'
-            else:
-                dis_instruction = f'{opcode} {address}'
+    def snapshot(self):
+        """
+        Captures RAM, registers, device ports and execution state
+        :return: Snapshot
+        """
+        registers = self.registers
+        return Snapshot(bytes(self.ram),
+                        (bytes(registers.gpr), registers.pc, registers.sp, registers.ir, registers.cond),
+                        tuple(self.ports.items()), self.program_counter, self.prev_program_counter,
+                        self.is_running)
+
+    def restore(self, snapshot):
+        """
+        Puts the simulator back in a state captured by snapshot. The undo journal is emptied, its entries
+        undo the instructions of the run left behind.
+        :param snapshot: Snapshot
+        """
+        if self.block_compiler is not None:
+            self.block_compiler.invalidate_changed(snapshot.ram)
+        self.ram[:] = snapshot.ram
+        self.dirty.clear()
+        self.stopped_at = None
+        if self.journal is not None:
+            self.journal.clear()
+        registers = self.registers
+        registers.gpr[:] = snapshot.registers[0]
+        registers.pc, registers.sp, registers.ir, registers.cond = snapshot.registers[1:]
+        self.ports.clear()
+        self.ports.update(snapshot.ports)
+        self.program_counter = snapshot.program_counter
+        self.prev_program_counter = snapshot.prev_program_counter
+        self.is_running = snapshot.is_running
+
+    def reset(self):
+        """
+        Puts the simulator back in the state right after the last read_obj_file, without reading the
+        file again. Clears the simulator if nothing was loaded.
+        """
+        if self.loaded_image is None:
+            self.micro_clear()
         else:
-            dis_instruction = f'{opcode}'
+            self.restore(self.loaded_image)
 
-        return dis_instruction.upper()
+    def take_dirty(self):
+        """
+        Gets the addresses written since the last call, so a view of RAM can update only those.
+        Loads, clears and restores are not tracked and call for a full refresh.
+        :return: list of int sorted addresses
+        """
+        dirty = sorted(self.dirty)
+        self.dirty.clear()
+        return dirty
+
+    def disassembled_instruction(self):
+        """Disassembles executed assembly instruction"""
+        return disassemble(self.ram[self.program_counter] << 8 | self.ram[self.program_counter + 1])
 
     def run_micro_instructions(self, timeout=0):
         """
@@ -101,15 +422,371 @@ class MicroSim:
             self.program_counter -= 1
             raise SystemError('Invalid PC value')
 
-        REGISTER['ir'] = f'{RAM[self.program_counter]}{RAM[self.program_counter + 1]}'
-        binary_instruction = hex_to_binary(
-            f'{RAM[self.program_counter]}{RAM[self.program_counter + 1]}')
-        self.execute_instruction(binary_instruction)
+        word = self.ram[self.program_counter] << 8 | self.ram[self.program_counter + 1]
+        self.registers.ir = word
+        self.execute_instruction(word)
         if self.prev_program_counter == self.program_counter:
             self.is_running = False
         else:
             self.prev_program_counter = self.program_counter
 
+    def set_breakpoint(self, address, enabled=True):
+        """
+        Sets or removes a breakpoint. Execution stops when the program counter reaches it, before the
+        instruction there runs.
+        :param address: int
+        :param enabled: bool
+        """
+        if not 0 <= address < len(self.ram):
+            raise ValueError(f'Invalid breakpoint address {address}')
+        self.breakpoints[address] = int(enabled)
+        self.bind_instruction_hooks()
+
+    def set_watchpoint(self, address, access=WATCH_READ | WATCH_WRITE):
+        """
+        Sets the accesses to a memory address that stop execution right after the instruction making them.
+        Checked by load, loadrind, pop and return for reads and store, storerind, push and call for writes.
+        :param address: int
+        :param access: int WATCH_READ and WATCH_WRITE flags, 0 removes the watchpoint
+        """
+        if not 0 <= address < len(self.ram):
+            raise ValueError(f'Invalid watchpoint address {address}')
+        self.watchpoints[address] = access
+
+    def clear_breakpoints(self):
+        """
+        Removes every breakpoint and watchpoint
+        """
+        self.breakpoints[:] = bytes(len(self.breakpoints))
+        self.watchpoints[:] = bytes(len(self.watchpoints))
+        self.bind_instruction_hooks()
+
+    def has_breakpoints(self):
+        """
+        Checks if any breakpoint or watchpoint is set
+        :return: bool
+        """
+        return (self.breakpoints.count(0) != len(self.breakpoints) or
+                self.watchpoints.count(0) != len(self.watchpoints))
+
+    def resume(self):
+        """
+        Marks the program running from the current state, such as after a breakpoint or watchpoint stopped it.
+        Breakpoints are checked after each instruction, so one on the first instruction of the program stops
+        it here instead, unless that is the stop being resumed from.
+        """
+        program_counter = self.program_counter
+        resuming = self.stopped_at == (BREAKPOINT, program_counter)
+        self.is_running = True
+        self.stopped_at = None
+        if (self.prev_program_counter == -1 and not resuming and 0 <= program_counter < len(self.ram) and
+                self.breakpoints[program_counter]):
+            self.stop_at(BREAKPOINT, program_counter)
+
+    def stop_at(self, reason, address):
+        """
+        Stops execution at a breakpoint or watchpoint
+        :param reason: str BREAKPOINT, READ or WRITE
+        :param address: int
+        """
+        self.is_running = False
+        self.stopped_at = (reason, address)
+
+    def enable_journal(self, size=10000):
+        """
+        Records what each instruction run by run_micro_instructions overwrites, so step_back can undo
+        it. Only the last size instructions are kept. Compiled blocks are not used while recording.
+        :param size: int
+        """
+        self.journal = deque(maxlen=size)
+        self.bind_instruction_hooks()
+
+    def disable_journal(self):
+        """
+        Stops recording undo entries and drops the recorded ones
+        """
+        self.journal = None
+        self.bind_instruction_hooks()
+
+    def enable_profile(self):
+        """
+        Starts counting the instructions run by run_micro_instructions per address and per opcode, and
+        how often each conditional jump and loop was taken. Counting starts over from zero. Compiled
+        blocks are not used while profiling.
+        :return: Profile
+        """
+        self.profile = Profile(len(self.ram))
+        self.bind_instruction_hooks()
+        return self.profile
+
+    def disable_profile(self):
+        """
+        Stops counting instructions
+        :return: Profile counts recorded so far, or None
+        """
+        profile = self.profile
+        self.profile = None
+        self.bind_instruction_hooks()
+        return profile
+
+    def profile_report(self, labels=None, top=10):
+        """
+        Formats the hottest addresses of the current profile, see Profile.report
+        :param labels: dict label -> address, such as Assembler.variables
+        :param top: int
+        :return: str
+        """
+        if self.profile is None:
+            return 'Profiling is off.'
+        return self.profile.report(self.ram, labels, top)
+
+    def bind_instruction_hooks(self):
+        """
+        Points run_micro_instructions at the breakpoint check and recording wrappers that are enabled.
+        With none of them, the class method runs without any extra cost.
+        """
+        if self.breakpoints.count(0) != len(self.breakpoints):
+            self.run_micro_instructions = self.run_breakpoint_instruction
+        elif self.profile is not None:
+            self.run_micro_instructions = self.run_profiled_instruction
+        elif self.journal is not None:
+            self.run_micro_instructions = self.run_journaled_instruction
+        else:
+            self.__dict__.pop('run_micro_instructions', None)
+
+    def written_addresses(self, word):
+        """
+        Gets the RAM addresses an instruction is about to write
+        :param word: int
+        :return: tuple
+        """
+        opcode, register_a, register_b, register_c, address = self.decode_table[word]
+        registers = self.registers
+        if opcode == STORE_OPCODE:
+            return address,
+        if opcode == STORERIND_OPCODE:
+            return registers.gpr[register_a],
+        if opcode == PUSH_OPCODE:
+            return (registers.sp - 1) % len(self.ram),
+        if opcode == CALL_OPCODE:
+            stack_pointer = (registers.sp - 2) % len(self.ram)
+            return tuple(range(stack_pointer, min(stack_pointer + 2, len(self.ram))))
+        return ()
+
+    def run_breakpoint_instruction(self, timeout=0):
+        """
+        Runs an instruction like run_micro_instructions and stops if the program counter reaches a breakpoint
+        :param timeout: int
+        """
+        if self.profile is not None:
+            self.run_profiled_instruction(timeout)
+        elif self.journal is not None:
+            self.run_journaled_instruction(timeout)
+        else:
+            MicroSim.run_micro_instructions(self, timeout)
+        if self.is_running and self.breakpoints[self.program_counter]:
+            self.stop_at(BREAKPOINT, self.program_counter)
+
+    def run_journaled_instruction(self, timeout=0):
+        """
+        Runs an instruction like run_micro_instructions after recording the state it overwrites
+        :param timeout: int
+        """
+        registers = self.registers
+        program_counter = self.program_counter
+        ram_writes = ()
+        if program_counter % 2 == 0 and program_counter + 1 < len(self.ram):
+            word = self.ram[program_counter] << 8 | self.ram[program_counter + 1]
+            ram_writes = tuple((address, self.ram[address]) for address in self.written_addresses(word))
+        self.journal.append((program_counter, self.prev_program_counter, self.is_running, bytes(registers.gpr),
+                             registers.pc, registers.sp, registers.ir, registers.cond, ram_writes))
+        MicroSim.run_micro_instructions(self, timeout)
+
+    def run_profiled_instruction(self, timeout=0):
+        """
+        Runs an instruction like run_micro_instructions and counts it in the profile
+        :param timeout: int
+        """
+        program_counter = self.program_counter
+        ram = self.ram
+        word = -1
+        if program_counter % 2 == 0 and program_counter + 1 < len(ram):
+            word = ram[program_counter] << 8 | ram[program_counter + 1]
+        if self.journal is not None:
+            self.run_journaled_instruction(timeout)
+        else:
+            MicroSim.run_micro_instructions(self, timeout)
+        if word < 0:
+            return
+        profile = self.profile
+        profile.executions[program_counter] += 1
+        if not word:
+            profile.opcodes[NOP_OPCODE] += 1
+            return
+        opcode = word >> 11
+        profile.opcodes[opcode] += 1
+        # Jumps are counted from the state they leave behind: jumps do not change cond and the loop
+        # register holds its decremented value, non-zero when it jumped.
+        if opcode == JCONDADDR_OPCODE or opcode == JCONDRIN_OPCODE:
+            taken = self.registers.cond
+        elif opcode == LOOP_OPCODE:
+            taken = self.registers.gpr[word >> 8 & 7]
+        else:
+            return
+        if taken:
+            profile.taken[program_counter] += 1
+        else:
+            profile.not_taken[program_counter] += 1
+
+    def step_back(self, count=1):
+        """
+        Undoes the last instructions recorded in the journal
+        :param count: int
+        :return: int number of instructions undone, fewer than count if the journal runs out
+        """
+        registers = self.registers
+        compiler = self.block_compiler
+        steps = 0
+        while steps < count and self.journal:
+            (self.program_counter, self.prev_program_counter, self.is_running, gpr,
+             registers.pc, registers.sp, registers.ir, registers.cond, ram_writes) = self.journal.pop()
+            registers.gpr[:] = gpr
+            for address, value in ram_writes:
+                self.ram[address] = value
+                self.dirty.add(address)
+                if compiler is not None and compiler.code_map[address]:
+                    compiler.invalidate(address)
+            steps += 1
+        return steps
+
+    def run_back_to(self, address):
+        """
+        Undoes instructions until the program counter is back at an address
+        :param address: int
+        :return: int number of instructions undone, the whole journal if address is not found
+        """
+        steps = 0
+        while self.step_back():
+            steps += 1
+            if self.program_counter == address:
+                break
+        return steps
+
+    def run(self, max_steps=0, timeout=0, check_interval=4096, compiled=False, detect_cycles=True):
+        """
+        Runs the loaded program without the GUI until it halts, runs max_steps instructions,
+        an instruction fails, the wall-clock timeout passes, it is found looping forever or it reaches
+        a breakpoint or watchpoint. Runs on from the current state, so it continues past the breakpoint or
+        watchpoint that stopped the previous run.
+        :param max_steps: int maximum number of instructions to execute, 0 for no limit
+        :param timeout: float seconds allowed, 0 for no limit. Checked every check_interval instructions.
+        :param check_interval: int
+        :param compiled: bool run through compiled basic blocks, see run_blocks
+        :param detect_cycles: bool stop on a repeated machine state, see CycleDetector
+        :return: RunResult
+        """
+        self.resume()
+        deadline = time.perf_counter() + timeout if timeout else 0
+        start = self.counter
+        detector = CycleDetector(self) if detect_cycles else None
+        run_chunk = self.run_blocks if compiled else self.run_steps
+        try:
+            while True:
+                steps = self.counter - start
+                chunk = max_steps - steps if max_steps else BLOCK_BUDGET
+                if deadline:
+                    chunk = min(chunk, check_interval)
+                run_chunk(chunk, detector)
+                steps = self.counter - start
+                if self.stopped_at is not None:
+                    return RunResult(self.stopped_at[0], steps, address=self.stopped_at[1])
+                if not self.is_running:
+                    return RunResult(HALT, steps)
+                if detector is not None and detector.period:
+                    self.is_running = False
+                    return RunResult(CYCLE, steps, period=detector.period)
+                if max_steps and steps >= max_steps:
+                    return RunResult(BUDGET, steps)
+                if deadline and time.perf_counter() > deadline:
+                    self.is_running = False
+                    return RunResult(TIMEOUT, steps)
+        except (SystemError, ValueError, IndexError) as e:
+            self.is_running = False
+            return RunResult(ERROR, self.counter - start, e)
+
+    def run_steps(self, max_steps, detector=None):
+        """
+        Runs up to max_steps instructions one at a time, stopping early if the program halts
+        :param max_steps: int maximum number of instructions to execute, 0 for no limit
+        :param detector: CycleDetector to stop early on an infinite loop
+        :return: int number of instructions executed
+        """
+        if not max_steps:
+            max_steps = sys.maxsize
+        run_micro_instruction = self.run_micro_instructions
+        steps = 0
+        try:
+            while self.is_running and steps < max_steps:
+                # With a detector, the state is sampled every CYCLE_CHECK_INTERVAL instructions.
+                end = min(max_steps, steps + CYCLE_CHECK_INTERVAL) if detector is not None else max_steps
+                while self.is_running and steps < end:
+                    run_micro_instruction()
+                    steps += 1
+                if detector is not None and self.is_running and detector.check(self.counter + steps):
+                    break
+        finally:
+            self.counter += steps
+        return steps
+
+    def run_blocks(self, max_steps=0, detector=None):
+        """
+        Runs instructions through compiled basic blocks until the program halts.
+        Leaves RAM and registers exactly as repeated calls to run_micro_instructions would.
+        Writes to RAM made outside the simulator while it runs must call block_compiler.invalidate.
+        :param max_steps: int maximum number of instructions to execute, 0 for no limit
+        :param detector: CycleDetector checked between blocks to stop early on an infinite loop
+        :return: int number of instructions executed
+        """
+        if self.journal is not None or self.profile is not None or self.has_breakpoints():
+            # Blocks would bypass the journal, the profile and the breakpoints.
+            return self.run_steps(max_steps, detector)
+        if self.block_compiler is None:
+            self.block_compiler = BlockCompiler(self.ram, self.registers, self.decode_table, self.bus.devices,
+                                                self.dirty)
+        compiler = self.block_compiler
+        blocks = compiler.blocks
+        registers = self.registers
+        steps = 0
+        try:
+            while self.is_running and (not max_steps or steps < max_steps):
+                budget = max_steps - steps if max_steps else BLOCK_BUDGET
+                pc = self.program_counter
+                block = blocks[pc] if pc in blocks else compiler.get_block(pc)
+                if block is None or block[1] > budget:
+                    self.run_micro_instructions()
+                    steps += 1
+                else:
+                    function, length, halt_address, words = block
+                    if detector is not None:
+                        # Blocks that repeat stop at their start when the next checkpoint is due.
+                        budget = min(budget, max(length, detector.next_checkpoint - self.counter - steps))
+                    # A jump to self halts once it runs with the program counter already on it, like
+                    # run_micro_instructions does. A lone jump entered first thing (previous -1) runs twice.
+                    entered = self.prev_program_counter
+                    pc, count = function(budget)
+                    steps += count
+                    registers.ir = words[(count - 1) % length]
+                    registers.pc = pc
+                    self.program_counter = pc
+                    self.prev_program_counter = pc
+                    if count == length and pc == halt_address and (length > 1 or entered == pc):
+                        self.is_running = False
+                if detector is not None and self.is_running and detector.check(self.counter + steps):
+                    break
+        finally:
+            self.counter += steps
+        return steps
+
     def micro_clear(self):
         """
         Resets microprocessor simulator to initial conditions
@@ -120,176 +797,228 @@ class MicroSim:
         self.is_running = False
         self.prev_program_counter = -1
         self.counter = 0
-        clear_ram()
-        clear_registers()
+        self.stopped_at = None
+        self.dirty.clear()
+        self.block_compiler = None
+        self.loaded_image = None
+        if self.journal is not None:
+            self.journal.clear()
+        self.ram[:] = bytes(len(self.ram))
+        self.registers.clear()
 
-    def execute_instruction(self, instruction):
+    def execute_instruction(self, word):
         """
         Executes assembly instruction
-        :param instruction: str
+        :param word: int
         """
-        if re.match('^[0]+$', instruction):
-            self.prev_program_counter = self.program_counter
+        if word:
+            opcode, register_a, register_b, register_c, address = self.decode_table[word]
             self.program_counter += 2
-            if self.program_counter < 4096:
-                REGISTER['pc'] = convert_to_hex(self.program_counter, 3)
-            else:
-                self.program_counter = self.prev_program_counter
+            self.handlers[opcode](register_a, register_b, register_c, address)
         else:
-            opcode = get_opcode_key(instruction[0:5])
-
-            if opcode in FORMAT_1_OPCODE:
-                register_a = f'r{int(instruction[5:8], 2)}'
-                register_b = f'r{int(instruction[8:11], 2)}'
-                register_c = f'r{int(instruction[11:14], 2)}'
-                if opcode == 'loadrind':
-                    REGISTER[register_a] = RAM[int(REGISTER[register_b], 16)]
-                elif opcode == 'storerind':
-                    RAM[int(REGISTER[register_a], 16)] = REGISTER[register_b]
-                elif opcode == 'grt':
-                    _grt = int(REGISTER[register_a], 16) > int(
-                        REGISTER[register_b], 16)
-                    REGISTER['cond'] = convert_to_hex(_grt, 4)
-                elif opcode == 'add':
-                    _add = int(REGISTER[register_b], 16) + \
-                        int(REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_add, 8)
-                elif opcode == 'sub':
-                    _sub = int(REGISTER[register_b], 16) - \
-                        int(REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_sub, 8)
-                elif opcode == 'and':
-                    _and = int(REGISTER[register_b], 16) & int(
-                        REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_and, 8)
-                elif opcode == 'or':
-                    _or = int(REGISTER[register_b], 16) | int(REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_or, 8)
-                elif opcode == 'xor':
-                    _xor = int(REGISTER[register_b]) ^ int(
-                        REGISTER[register_c])
-                    REGISTER[register_a] = convert_to_hex(_xor, 8)
-                elif opcode == 'not':
-                    _not = self.bit_not(int(REGISTER[register_b], 16)) + 1
-                    REGISTER[register_a] = convert_to_hex(_not, 8)
-                elif opcode == 'neg':
-                    _neg = self.bit_not(int(REGISTER[register_b], 16))
-                    REGISTER[register_a] = convert_to_hex(_neg, 8)
-                elif opcode == 'shiftr':
-                    _shiftr = int(REGISTER[register_b], 16) >> int(
-                        REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_shiftr, 8)
-                elif opcode == 'shiftl':
-                    _shiftl = int(REGISTER[register_b], 16) << int(
-                        REGISTER[register_c], 16)
-                    REGISTER[register_a] = convert_to_hex(_shiftl, 8)
-                elif opcode == 'rotar':
-                    _rotar = self.rotr(int(REGISTER[register_b], 16), int(
-                        REGISTER[register_c], 16))
-                    REGISTER[register_a] = convert_to_hex(_rotar, 8)
-                elif opcode == 'rotal':
-                    _rotl = self.rotl(int(REGISTER[register_b], 16), int(
-                        REGISTER[register_c], 16))
-                    REGISTER[register_a] = convert_to_hex(_rotl, 8)
-                elif opcode == 'jmprind':
-                    self.program_counter = int(REGISTER[register_a], 16) - 2
-                    REGISTER['pc'] = f'{self.program_counter:03x}'
-                elif opcode == 'grteq':
-                    REGISTER['cond'] = str(int(int(REGISTER[register_a], 16) >= int(
-                        REGISTER[register_b], 16)))
-                elif opcode == 'eq':
-                    REGISTER['cond'] = str(int(int(REGISTER[register_a], 16) == int(
-                        REGISTER[register_b], 16)))
-                elif opcode == 'neq':
-                    REGISTER['cond'] = str(int(int(REGISTER[register_a], 16) != int(
-                        REGISTER[register_b], 16)))
-                self.program_counter += 2
-                REGISTER['pc'] = convert_to_hex(self.program_counter, 12)
-
-            elif opcode in FORMAT_2_OPCODE:
-                register_a = f'r{int(instruction[5:8], 2)}'
-                address_or_const = int(instruction[8:], 2)
-                if opcode == 'load':
-                    REGISTER[register_a] = convert_to_hex(
-                        int(RAM[address_or_const], 16), 8)
-                elif opcode == 'loadim':
-                    REGISTER[register_a] = convert_to_hex(address_or_const, 8)
-                elif opcode == 'store':
-                    RAM[address_or_const] = REGISTER[register_a]
-                elif opcode == 'addim':
-                    _addim = int(REGISTER[register_a], 16) + address_or_const
-                    REGISTER[register_a] = convert_to_hex(_addim, 8)
-                elif opcode == 'subim':
-                    _subim = int(REGISTER[register_a], 16) - address_or_const
-                    REGISTER[register_a] = convert_to_hex(_subim, 8)
-                elif opcode == 'pop':
-                    stack_pointer = int(REGISTER['sp'], 16)
-                    REGISTER[register_a] = RAM[stack_pointer]
-                    stack_pointer += 1
-                    if stack_pointer >= len(RAM):
-                        stack_pointer -= len(RAM)
-                    REGISTER['sp'] = convert_to_hex(stack_pointer, 12)
-                    REGISTER['r7'] = convert_to_hex(int(REGISTER['sp'], 16), 8)
-                elif opcode == 'push':
-                    stack_pointer = int(REGISTER['sp'], 16) - 1
-                    if stack_pointer < 0:
-                        stack_pointer += len(RAM)
-                    REGISTER['sp'] = convert_to_hex(stack_pointer, 12)
-                    REGISTER['r7'] = convert_to_hex(int(REGISTER['sp'], 16), 8)
-                    RAM[stack_pointer] = REGISTER[register_a]
-                elif opcode == 'loop':
-                    reg_ra = int(REGISTER[register_a], 16) - 1
-                    if reg_ra < 0:
-                        reg_ra = 0
-                    REGISTER[register_a] = convert_to_hex(reg_ra, 8)
-                    if reg_ra != 0:
-                        self.program_counter = address_or_const - 2
-                        self.prev_program_counter = self.program_counter - 2
-                        REGISTER['pc'] = convert_to_hex(
-                            self.program_counter, 12)
+            self.prev_program_counter = self.program_counter
+            if self.program_counter + 2 < 4096:
                 self.program_counter += 2
-                REGISTER['pc'] = convert_to_hex(
-                    int(REGISTER['pc'], 16) + 2, 12)
-            elif opcode in FORMAT_3_OPCODE:
-                register_a = f'r{int(instruction[5:8], 2)}'
-                address = int(instruction[5:], 2)
-                if opcode == 'jmpaddr':
-                    self.program_counter = address
-                    REGISTER['pc'] = convert_to_hex(address, 12)
-                elif opcode == 'jcondrin':
-                    REGISTER['pc'] = REGISTER[register_a] if int(REGISTER['cond']) else convert_to_hex(
-                        int(REGISTER['pc'], 16) + 2,
-                        12)
-                    self.program_counter = int(REGISTER['pc'], 16)
-                elif opcode == 'jcondaddr':
-                    REGISTER['pc'] = convert_to_hex(address, 12) if int(REGISTER['cond']) \
-                        else convert_to_hex(int(REGISTER['pc'], 16) + 2, 12)
-                    self.program_counter = int(REGISTER['pc'], 16)
-                elif opcode == 'call':
-                    stack_pointer = int(REGISTER['sp'], 16) - 2
-                    if stack_pointer < 0:
-                        stack_pointer += len(RAM)
-                    RAM[stack_pointer] = f'0{REGISTER["pc"][0]}'
-                    RAM[stack_pointer + 1] = REGISTER["pc"][1:]
-                    REGISTER['sp'] = convert_to_hex(stack_pointer, 12)
-                    REGISTER['r7'] = convert_to_hex(int(REGISTER['sp'], 16), 8)
-                    REGISTER['pc'] = convert_to_hex(address, 12)
-                    self.program_counter = address
-            elif opcode == 'return':
-                stack_pointer = int(REGISTER['sp'], 16)
-                self.program_counter = int(
-                    RAM[stack_pointer][1], 16) + int(RAM[stack_pointer + 1], 16) + 2
-                REGISTER['pc'] = convert_to_hex(self.program_counter, 12)
-                stack_pointer += 2
-                if stack_pointer >= len(RAM):
-                    stack_pointer -= len(RAM)
-                REGISTER['sp'] = convert_to_hex(stack_pointer, 12)
-                REGISTER['r7'] = convert_to_hex(int(REGISTER['sp'], 16), 8)
-        if REGISTER['r0'] != '00':
-            raise SystemError('R0 cannot be modified')
-        REGISTER['sp'] = convert_to_hex(int(REGISTER['r7'], 16), 12)
-        if (int(REGISTER['r7'], 16) > 255):
-            REGISTER['r7'] = convert_to_hex(int(REGISTER['r7'], 16) & 255, 8)
+        self.registers.pc = self.program_counter
+
+    # Instruction handlers. The program counter already points to the next instruction when they run.
+
+    def _op_load(self, register_a, register_b, register_c, address):
+        if self.watchpoints[address] & WATCH_READ:
+            self.stop_at(READ, address)
+        self.registers.write(register_a, self.ram[address])
+
+    def _op_loadim(self, register_a, register_b, register_c, address):
+        self.registers.write(register_a, address)
+
+    def _op_pop(self, register_a, register_b, register_c, address):
+        registers = self.registers
+        stack_pointer = registers.sp
+        if self.watchpoints[stack_pointer] & WATCH_READ:
+            self.stop_at(READ, stack_pointer)
+        registers.write(register_a, self.ram[stack_pointer])
+        stack_pointer += 1
+        if stack_pointer >= len(self.ram):
+            stack_pointer -= len(self.ram)
+        registers.move_stack_pointer(stack_pointer)
+
+    def _op_store(self, register_a, register_b, register_c, address):
+        if self.watchpoints[address] & WATCH_WRITE:
+            self.stop_at(WRITE, address)
+        self.ram[address] = self.registers.gpr[register_a]
+        self.ram_written(address)
+
+    def _op_push(self, register_a, register_b, register_c, address):
+        registers = self.registers
+        stack_pointer = registers.sp - 1
+        if stack_pointer < 0:
+            stack_pointer += len(self.ram)
+        registers.move_stack_pointer(stack_pointer)
+        if self.watchpoints[stack_pointer] & WATCH_WRITE:
+            self.stop_at(WRITE, stack_pointer)
+        self.ram[stack_pointer] = registers.gpr[register_a]
+        self.ram_written(stack_pointer)
+
+    def _op_loadrind(self, register_a, register_b, register_c, address):
+        address = self.registers.gpr[register_b]
+        if self.watchpoints[address] & WATCH_READ:
+            self.stop_at(READ, address)
+        self.registers.write(register_a, self.ram[address])
+
+    def _op_storerind(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        address = gpr[register_a]
+        if self.watchpoints[address] & WATCH_WRITE:
+            self.stop_at(WRITE, address)
+        self.ram[address] = gpr[register_b]
+        self.ram_written(address)
+
+    def write_memory(self, address, value):
+        """
+        Writes memory from outside the program, such as an input device, with the bookkeeping of an instruction
+        write: marks the address dirty and drops the compiled blocks holding it. The device on the address is
+        not notified, the write comes from it.
+        :param address: int
+        :param value: int
+        """
+        self.ram[address] = value
+        self.dirty.add(address)
+        compiler = self.block_compiler
+        if compiler is not None and compiler.code_map[address]:
+            compiler.invalidate(address)
+
+    def ram_written(self, address):
+        """
+        Records a write made by an interpreted instruction: marks the address dirty, drops the compiled
+        blocks holding it and notifies the device on it
+        :param address: int
+        """
+        self.dirty.add(address)
+        compiler = self.block_compiler
+        if compiler is not None and compiler.code_map[address]:
+            compiler.invalidate(address)
+        device = self.bus.devices[address]
+        if device is not None:
+            device(address, self.ram[address])
+
+    def _op_add(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, (gpr[register_b] + gpr[register_c]) & 0xFF)
+
+    def _op_sub(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, (gpr[register_b] - gpr[register_c]) & 0xFF)
+
+    def _op_addim(self, register_a, register_b, register_c, address):
+        self.registers.write(register_a, (self.registers.gpr[register_a] + address) & 0xFF)
+
+    def _op_subim(self, register_a, register_b, register_c, address):
+        self.registers.write(register_a, (self.registers.gpr[register_a] - address) & 0xFF)
+
+    def _op_and(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, gpr[register_b] & gpr[register_c])
+
+    def _op_or(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, gpr[register_b] | gpr[register_c])
+
+    def _op_xor(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, gpr[register_b] ^ gpr[register_c])
+
+    def _op_not(self, register_a, register_b, register_c, address):
+        self.registers.write(register_a, (self.bit_not(self.registers.gpr[register_b]) + 1) & 0xFF)
+
+    def _op_neg(self, register_a, register_b, register_c, address):
+        self.registers.write(register_a, self.bit_not(self.registers.gpr[register_b]))
+
+    def _op_shiftr(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, gpr[register_b] >> gpr[register_c])
+
+    def _op_shiftl(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, (gpr[register_b] << gpr[register_c]) & 0xFF)
+
+    def _op_rotar(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, self.rotr(gpr[register_b], gpr[register_c]) & 0xFF)
+
+    def _op_rotal(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.write(register_a, self.rotl(gpr[register_b], gpr[register_c]) & 0xFF)
+
+    def _op_jmprind(self, register_a, register_b, register_c, address):
+        self.program_counter = self.registers.gpr[register_a]
+
+    def _op_jmpaddr(self, register_a, register_b, register_c, address):
+        self.program_counter = address
+
+    def _op_jcondrin(self, register_a, register_b, register_c, address):
+        if self.registers.cond:
+            self.program_counter = self.registers.gpr[register_a]
+
+    def _op_jcondaddr(self, register_a, register_b, register_c, address):
+        if self.registers.cond:
+            self.program_counter = address
+
+    def _op_loop(self, register_a, register_b, register_c, address):
+        reg_ra = self.registers.gpr[register_a] - 1
+        if reg_ra < 0:
+            reg_ra = 0
+        self.registers.write(register_a, reg_ra)
+        if reg_ra != 0:
+            self.program_counter = address
+            # A loop back onto itself must not be mistaken for a jump to self (halt).
+            self.prev_program_counter = address - 2
+
+    def _op_grt(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.cond = int(gpr[register_a] > gpr[register_b])
+
+    def _op_grteq(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.cond = int(gpr[register_a] >= gpr[register_b])
+
+    def _op_eq(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.cond = int(gpr[register_a] == gpr[register_b])
+
+    def _op_neq(self, register_a, register_b, register_c, address):
+        gpr = self.registers.gpr
+        self.registers.cond = int(gpr[register_a] != gpr[register_b])
+
+    def _op_nop(self, register_a, register_b, register_c, address):
+        pass
+
+    def _op_call(self, register_a, register_b, register_c, address):
+        registers = self.registers
+        stack_pointer = registers.sp - 2
+        if stack_pointer < 0:
+            stack_pointer += len(self.ram)
+        return_address = self.program_counter - 2
+        for watched in (stack_pointer, stack_pointer + 1):
+            if self.watchpoints[watched] & WATCH_WRITE:
+                self.stop_at(WRITE, watched)
+        self.ram[stack_pointer] = return_address >> 8
+        self.ram[stack_pointer + 1] = return_address & 0xFF
+        registers.move_stack_pointer(stack_pointer)
+        self.ram_written(stack_pointer)
+        self.ram_written(stack_pointer + 1)
+        self.program_counter = address
+
+    def _op_return(self, register_a, register_b, register_c, address):
+        registers = self.registers
+        stack_pointer = registers.sp
+        for watched in (stack_pointer, stack_pointer + 1):
+            if self.watchpoints[watched] & WATCH_READ:
+                self.stop_at(READ, watched)
+        self.program_counter = ((self.ram[stack_pointer] & 0x0F) << 8 | self.ram[stack_pointer + 1]) + 2
+        stack_pointer += 2
+        if stack_pointer >= len(self.ram):
+            stack_pointer -= len(self.ram)
+        registers.move_stack_pointer(stack_pointer)
 
     def bit_not(self, num, bits=8):
         """
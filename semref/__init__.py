@@ -0,0 +1,9 @@
+"""
+Semref core: the assembler and the microprocessor simulator, importable without the GUI.
+Kivy is only imported when the GUI is started, with main.py or `python -m semref gui`.
+"""
+from assembler import Assembler
+from io_bus import IOBus
+from microprocessor_simulator import MicroSim, RunResult, disassemble
+
+__all__ = ['Assembler', 'IOBus', 'MicroSim', 'RunResult', 'disassemble']
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+
+from batch import LOAD_ERRORS, assemble, run_program
+from microprocessor_simulator import ERROR, MicroSim
+
+
+def write_obj(ram, filename):
+    """
+    Writes memory as an .obj file, one instruction word per line, up to the last non-zero word
+    :param ram: bytearray
+    :param filename: str
+    """
+    length = len(ram.rstrip(b'\0'))
+    length += length % 2
+    with open(filename, 'w') as file:
+        for address in range(0, length, 2):
+            file.write(f'{ram[address]:02X} {ram[address + 1]:02X}\n')
+
+
+def load(filename):
+    """
+    Assembles an .asm file or loads an .obj file
+    :param filename: str
+    :return: MicroSim with the program loaded
+    """
+    if filename.endswith('.asm'):
+        return MicroSim(ram=assemble(filename).ram)
+    micro_sim = MicroSim()
+    micro_sim.read_obj_file(filename)
+    return micro_sim
+
+
+def report(filename, error):
+    """
+    Prints why a program could not be loaded
+    :param filename: str
+    :param error: Exception
+    :return: int exit status
+    """
+    print(f'{filename}: {type(error).__name__}: {error}', file=sys.stderr)
+    return 1
+
+
+def assemble_command(args):
+    output = args.output or os.path.splitext(args.file)[0] + '.obj'
+    try:
+        ram = assemble(args.file).ram
+    except LOAD_ERRORS as e:
+        return report(args.file, e)
+    write_obj(ram, output)
+    print(output)
+    return 0
+
+
+def run_command(args):
+    result = run_program(args.file, args.max_steps, args.timeout, compiled=args.compiled, profile=args.profile)
+    profile = result.pop('profile', None)
+    print(json.dumps(result, indent=2))
+    if profile:
+        print(profile)
+    return 1 if result['status'] == ERROR else 0
+
+
+def dump_command(args):
+    try:
+        micro_sim = load(args.file)
+    except LOAD_ERRORS as e:
+        return report(args.file, e)
+    if args.run:
+        result = micro_sim.run(args.max_steps, args.timeout)
+        print(f'{result.reason} after {result.steps} instructions')
+    print(' '.join(f'{name.upper()}={value}' for name, value in micro_sim.registers.items()))
+    ram = micro_sim.ram
+    for address in range(0, len(ram), 16):
+        row = ram[address:address + 16]
+        if any(row) or args.all:
+            print(f'{address:03X}: ' + ' '.join(f'{byte:02X}' for byte in row))
+    return 0
+
+
+def gui_command(args):
+    # Kivy is only imported here, so the other commands start without it
+    from GUI.window import SemrefApp
+    SemrefApp().run()
+    return 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m semref',
+                                     description='Semref assembler and microprocessor simulator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('assemble', help='assemble an .asm file into an .obj file')
+    command.add_argument('file', help='.asm file')
+    command.add_argument('-o', '--output', help='.obj file, defaults to the .asm file name')
+    command.set_defaults(handler=assemble_command)
+
+    for name, handler, description in (('run', run_command, 'run a program and print its result as JSON'),
+                                       ('dump', dump_command, 'print the registers and non-zero memory rows')):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('file', help='.asm or .obj file')
+        command.add_argument('--max-steps', type=int, default=1000000, help='instruction budget')
+        command.add_argument('--timeout', type=float, default=5, help='seconds allowed, 0 for none')
+        command.set_defaults(handler=handler)
+        if name == 'run':
+            command.add_argument('--compiled', action='store_true', help='run through compiled basic blocks')
+            command.add_argument('--profile', action='store_true', help='report the most executed instructions')
+        else:
+            command.add_argument('--run', action='store_true', help='run the program before dumping')
+            command.add_argument('--all', action='store_true', help='include the rows of zeros')
+
+    command = commands.add_parser('gui', help='start the graphical simulator')
+    command.set_defaults(handler=gui_command)
+
+    args = parser.parse_args(args)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
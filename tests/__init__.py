@@ -0,0 +1,9 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# Keeps the decode table cache written by MicroSim out of the user's home directory, see decode_table_path
+if 'SEMREF_CACHE' not in os.environ:
+    os.environ['SEMREF_CACHE'] = tempfile.mkdtemp(prefix='semref-tests-')
+    atexit.register(shutil.rmtree, os.environ['SEMREF_CACHE'], True)
@@ -298,6 +298,15 @@ class AssemblerTestCase(TestCase):
             with self.assertRaises(AssertionError):
                 asm.read_source()
 
+        # LOADIM R7, #100 does not fit its immediate in a byte
+        filename = '../input/sprt5Test3-rey.asm' if sys.platform == 'win32' else 'input/sprt5Test3-rey.asm'
+        asm = Assembler(filename=filename)
+        asm.read_source()
+        asm.store_instructions_in_ram()
+        asm.verify_ram_content()
+        with self.assertRaisesRegex(SyntaxError, 'address 001'):
+            asm.hexify_ram_content()
+
     def test_invalid_indentation(self):
         """
         Verifies assembler detects indentation errors and raises an error
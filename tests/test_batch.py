@@ -0,0 +1,44 @@
+import io
+import json
+import os
+import sys
+from unittest import TestCase
+
+from batch import find_programs, run_batch, run_program
+
+
+class BatchTest(TestCase):
+    input_directory = '../input' if sys.platform == 'win32' else 'input'
+    output_directory = '../output' if sys.platform == 'win32' else 'output'
+
+    def test_run_program(self):
+        result = run_program(os.path.join(self.output_directory, 'test5.obj'))
+        self.assertEqual(('halt', 8), (result['status'], result['steps']))
+        self.assertEqual('A81E', result['registers']['ir'])
+
+        assembled = run_program(os.path.join(self.input_directory, 'test5.asm'))
+        self.assertEqual(result['ram_sha256'], assembled['ram_sha256'])
+
+        result = run_program(os.path.join(self.output_directory, 'test9.obj'), max_steps=500)
+        self.assertEqual(('budget', 500), (result['status'], result['steps']))
+
+        profiled = run_program(os.path.join(self.input_directory, 'test5.asm'), profile=True)
+        self.assertEqual(assembled['registers'], profiled['registers'])
+        self.assertTrue(profiled['profile'].startswith('8 instructions'))
+        self.assertNotIn('profile', assembled)
+
+        result = run_program(os.path.join(self.input_directory, 'indent_test1.asm'))
+        self.assertEqual(('error', 'assemble'), (result['status'], result['stage']))
+        self.assertTrue(result['error'].startswith('AssertionError'))
+
+    def test_run_batch(self):
+        programs = find_programs([self.output_directory])
+        self.assertIn(os.path.join(self.output_directory, 'test5.obj'), programs)
+        self.assertTrue(all(program.endswith('.obj') for program in programs))
+
+        output = io.StringIO()
+        errors = run_batch(programs, output, workers=2, max_steps=1000)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(programs, [result['file'] for result in results])
+        self.assertEqual(errors, sum(result['status'] == 'error' for result in results))
+        self.assertEqual(run_program(programs[0], max_steps=1000), results[0])
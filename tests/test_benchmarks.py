@@ -0,0 +1,34 @@
+import sys
+from unittest import TestCase
+
+from benchmarks import bench_simulator, compare, metric
+from benchmarks.bench_gui import measure
+
+
+class BenchmarksTest(TestCase):
+
+    def test_compare(self):
+        baseline = {'rate': metric(100.0, 'lines/s', True), 'time': metric(10.0, 'ms', False)}
+        self.assertEqual([], compare(baseline, {'rate': metric(95.0, 'lines/s', True),
+                                                'time': metric(10.5, 'ms', False),
+                                                'new': metric(1.0, 'ms', False)}))
+        regressions = compare(baseline, {'rate': metric(80.0, 'lines/s', True), 'time': metric(8.0, 'ms', False)})
+        self.assertEqual([('rate', 100.0, 80.0, -0.2)], regressions)
+        regressions = compare(baseline, {'rate': metric(150.0, 'lines/s', True), 'time': metric(15.0, 'ms', False)})
+        self.assertEqual([('time', 10.0, 15.0, -0.5)], regressions)
+
+    def test_gui_tables_without_kivy(self):
+        modules = dict(sys.modules)
+        results = measure(repeat=1)
+        self.assertEqual({'gui_memory_refresh', 'gui_memory_update', 'gui_register_refresh', 'gui_instruction_update'},
+                         set(results))
+        self.assertTrue(all(result['value'] > 0 for result in results.values()))
+        # The stubs and the GUI built on them do not outlive the measure
+        self.assertEqual(modules, dict(sys.modules))
+
+    def test_simulator_corpus(self):
+        # The corpus includes programs that fail to load, which are skipped
+        programs = '../' + bench_simulator.PROGRAMS if sys.platform == 'win32' else bench_simulator.PROGRAMS
+        results = bench_simulator.measure(programs, steps=1000)
+        self.assertEqual({'simulator', 'simulator_compiled'}, set(results))
+        self.assertTrue(all(result['value'] > 0 for result in results.values()))
@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+from history import InstructionHistory
+
+
+class InstructionHistoryTest(TestCase):
+
+    def test_ring_buffer(self):
+        history = InstructionHistory(capacity=4)
+        for address in range(0, 12, 2):
+            history.append(address, 0x0900 + address)
+        self.assertEqual((4, 6), (len(history), history.total))
+        self.assertEqual([(4, 0x0904), (6, 0x0906), (8, 0x0908), (10, 0x090A)], list(history))
+        self.assertEqual((10, 0x090A), history[-1])
+        with self.assertRaises(IndexError):
+            history[4]
+
+        self.assertEqual((10, 0x090A), history.pop())
+        self.assertEqual((8, 0x0908), history.pop())
+        history.append(12, 0x090C)
+        self.assertEqual([(4, 0x0904), (6, 0x0906), (12, 0x090C)], list(history))
+        self.assertEqual(5, history.total)
+
+        history.clear()
+        self.assertEqual((0, 0), (len(history), history.total))
+        with self.assertRaises(IndexError):
+            history.pop()
@@ -0,0 +1,160 @@
+import time
+from unittest import TestCase
+
+from io_bus import CoalescingScheduler, IOBus, KeyboardInput
+from microprocessor_simulator import HALT, MicroSim
+
+
+class IOBusTest(TestCase):
+
+    def test_attach(self):
+        bus = IOBus()
+        writes = []
+
+        def handler(address, value):
+            writes.append((address, value))
+
+        bus.attach(3, handler, 8)
+        self.assertEqual([None] * 3 + [handler] * 8 + [None], bus.devices[:12])
+        with self.assertRaises(ValueError):
+            bus.attach(4090, handler, 8)
+
+        ram = bytearray(len(bus.devices))
+        bus.write(ram, 4, 0x41)
+        bus.write(ram, 2, 0x42)
+        self.assertEqual([(4, 0x41)], writes)
+        self.assertEqual(0x42, ram[2])
+        bus.refresh(ram)
+        self.assertEqual([(4, 0x41)] + [(address, ram[address]) for address in range(3, 11)], writes)
+
+        bus.detach(handler)
+        self.assertEqual([None] * len(bus.devices), bus.devices)
+
+    def test_simulator_writes(self):
+        # LOADIM R1, #41; STORE 20, R1; LOADIM R7, #22; PUSH R1; CALL 0E; ...; JMPADDR 0E
+        program = bytes.fromhex('0941 1920 0F22 2100 F00E 0000 0000 A80E')
+        for compiled in (False, True):
+            instance = MicroSim()
+            instance.ram[:len(program)] = program
+            writes = []
+            instance.bus.attach(0x1F, lambda address, value: writes.append((address, value)), 2)
+            result = instance.run(compiled=compiled)
+            self.assertEqual('halt', result.reason)
+            # PUSH writes 21, outside the ports. CALL writes its return address to 1F and 20.
+            self.assertEqual([(0x20, 0x41), (0x1F, 0x00), (0x20, 0x08)], writes)
+
+    def test_coalescing_scheduler(self):
+        scheduler = CoalescingScheduler()
+        lights = []
+        digits = []
+        bus = IOBus(16)
+        bus.attach(2, scheduler.wrap(lambda address, value: lights.append((address, value))), 2)
+        bus.attach(8, scheduler.wrap(lambda address, value: digits.append(value), key=lambda address, value: value & 1))
+        ram = bytearray(16)
+        for value in range(8):
+            bus.write(ram, 2, value)
+            bus.write(ram, 8, value)
+        bus.write(ram, 3, 0xFF)
+        self.assertEqual(([], []), (lights, digits))
+
+        # The last write to each port, and to each digit of the multiplexed one
+        self.assertEqual(4, scheduler.flush())
+        self.assertEqual([(2, 7), (3, 0xFF)], lights)
+        self.assertEqual([6, 7], digits)
+        self.assertEqual((17, 4), (scheduler.writes, scheduler.flushed))
+        self.assertEqual(0, scheduler.flush())
+
+    def wait_for(self, condition):
+        deadline = time.perf_counter() + 5
+        while not condition() and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        self.assertTrue(condition())
+
+    def test_keyboard_input(self):
+        wait_for = self.wait_for
+        instance = MicroSim()
+        ram = instance.ram
+        bus = instance.bus
+        writes = []
+        keyboard = KeyboardInput(instance.write_memory, 4, maxsize=2,
+                                 on_write=lambda address, value: writes.append(value))
+        bus.attach(4, keyboard.port_written, refresh=False)
+        self.assertTrue(keyboard.press(0x10))
+        wait_for(lambda: keyboard.written == 1)
+        # Written like an instruction would, so the memory table repaints it
+        self.assertEqual((0x10, [4]), (ram[4], instance.take_dirty()))
+
+        # Keys wait until the program consumes the one in the port
+        self.assertTrue(keyboard.press(0x20))
+        self.assertTrue(keyboard.press(0x30))
+        self.assertFalse(keyboard.press(0x40))
+        self.assertEqual((2, 1), (keyboard.depth(), keyboard.dropped))
+        time.sleep(0.01)
+        self.assertEqual(0x10, ram[4])
+        bus.write(ram, 4, 0)
+        wait_for(lambda: keyboard.written == 2)
+        self.assertEqual((0x20, 1), (ram[4], keyboard.depth()))
+
+        # Or, given a hold time, until it is over. The key replaced is dropped.
+        time.sleep(0.01)
+        self.assertEqual(0x20, ram[4])
+        with keyboard.condition:
+            keyboard.hold = 0
+            keyboard.condition.notify()
+        wait_for(lambda: keyboard.written == 3)
+        self.assertEqual([0x10, 0x20, 0x30], writes)
+        self.assertEqual((0x30, 0, 2), (ram[4], keyboard.depth(), keyboard.dropped))
+        keyboard.close()
+        keyboard.thread.join(5)
+        self.assertFalse(keyboard.thread.is_alive())
+
+    def test_keyboard_input_consumed_by_write(self):
+        ram = bytearray(16)
+        bus = IOBus(len(ram))
+        keyboard = KeyboardInput(ram.__setitem__, 4)
+        bus.attach(4, keyboard.port_written, refresh=False)
+
+        # Key 0 is a 0 byte, the program clearing the port still consumes it
+        keyboard.press(0x00)
+        self.wait_for(lambda: keyboard.written == 1)
+        keyboard.press(0x50)
+        time.sleep(0.01)
+        self.assertEqual((0, 1), (ram[4], keyboard.depth()))
+        bus.write(ram, 4, 0)
+        self.wait_for(lambda: keyboard.written == 2)
+        self.assertEqual((0x50, 0), (ram[4], keyboard.depth()))
+
+        # So does writing the key back, but not a refresh after a load or a step back
+        keyboard.press(0x60)
+        bus.refresh(ram)
+        time.sleep(0.01)
+        self.assertEqual((0x50, 1), (ram[4], keyboard.depth()))
+        bus.write(ram, 4, 0x50)
+        self.wait_for(lambda: keyboard.written == 3)
+        self.assertEqual(0x60, ram[4])
+
+        # Clearing memory forgets the key in the port
+        keyboard.press(0x70)
+        time.sleep(0.01)
+        self.assertEqual(1, keyboard.depth())
+        ram[4] = 0
+        keyboard.reset()
+        self.wait_for(lambda: keyboard.written == 4)
+        self.assertEqual((0x70, 0), (ram[4], keyboard.dropped))
+        keyboard.close()
+        keyboard.thread.join(5)
+        self.assertIsNone(keyboard.pending)
+
+    def test_keyboard_input_invalidates_blocks(self):
+        # LOADIM R1, #00; JMPADDR 02. The keyboard port is the immediate.
+        instance = MicroSim()
+        instance.ram[0:4] = bytes.fromhex('0900 A802')
+        self.assertEqual(HALT, instance.run(compiled=True).reason)
+        keyboard = KeyboardInput(instance.write_memory, 1)
+        keyboard.press(0x50)
+        self.wait_for(lambda: keyboard.written == 1)
+        keyboard.close()
+        instance.program_counter = 0
+        instance.prev_program_counter = -1
+        self.assertEqual(HALT, instance.run(compiled=True).reason)
+        self.assertEqual('50', instance.registers['r1'])
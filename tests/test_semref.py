@@ -0,0 +1,75 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from semref.__main__ import main
+
+
+class SemrefTest(TestCase):
+    input_directory = '../input' if sys.platform == 'win32' else 'input'
+    output_directory = '../output' if sys.platform == 'win32' else 'output'
+
+    def test_core_imports_without_kivy(self):
+        # Importing a blocked module raises ImportError
+        code = ('import sys\n'
+                'sys.modules.update(kivy=None, kivymd=None, pygments=None)\n'
+                'import semref, batch, history, worker')
+        process = subprocess.run([sys.executable, '-c', code], cwd=os.getcwd(), stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        self.assertEqual(0, process.returncode, process.stderr)
+
+    def test_commands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            obj = os.path.join(directory, 'test5.obj')
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(0, main(['assemble', os.path.join(self.input_directory, 'test5.asm'), '-o', obj]))
+            with open(obj) as file, open(os.path.join(self.output_directory, 'test5.obj')) as expected:
+                lines = file.read().splitlines()
+                self.assertEqual(expected.read().splitlines()[:len(lines)], lines)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(0, main(['run', obj]))
+            self.assertIn('"status": "halt"', output.getvalue())
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(0, main(['dump', obj, '--run']))
+            lines = output.getvalue().splitlines()
+            self.assertEqual('halt after 8 instructions', lines[0])
+            self.assertIn('IR=A81E', lines[1])
+            self.assertEqual('000: A8 0E 00 00 08 05 0A FF 73 00 00 00 00 00 01 04', lines[2])
+
+    def test_load_errors(self):
+        # Programs that cannot be loaded are reported, not raised
+        with tempfile.TemporaryDirectory() as directory:
+            obj = os.path.join(directory, 'out.obj')
+            immediate = os.path.join(directory, 'immediate.asm')
+            with open(immediate, 'w') as file:
+                file.write('    loadim r1, #zz\n')
+            malformed = os.path.join(directory, 'malformed.obj')
+            with open(malformed, 'w') as file:
+                file.write('09 zz\n')
+            missing = os.path.join(directory, 'missing.asm')
+            cases = [
+                (os.path.join(self.input_directory, 'test1.asm'), 'AssertionError: Indentation error'),
+                (missing, 'FileNotFoundError'),
+                (immediate, 'ValueError'),
+            ]
+            for bad, error in cases:
+                for command in (['assemble', bad, '-o', obj], ['dump', bad]):
+                    errors = io.StringIO()
+                    with contextlib.redirect_stderr(errors):
+                        self.assertEqual(1, main(command))
+                    self.assertTrue(errors.getvalue().startswith(f'{bad}: {error}'), errors.getvalue())
+
+            for bad, error in ((malformed, 'SyntaxError: Invalid object code on line 1'),
+                               (os.path.join(directory, 'missing.obj'), 'FileNotFoundError')):
+                errors = io.StringIO()
+                with contextlib.redirect_stderr(errors):
+                    self.assertEqual(1, main(['dump', bad]))
+                self.assertTrue(errors.getvalue().startswith(f'{bad}: {error}'), errors.getvalue())
@@ -1,11 +1,15 @@
+import os
 import sys
+import tempfile
 from unittest import TestCase
 
 import mock
 
-from microprocessor_simulator import MicroSim
+import microprocessor_simulator
+from microprocessor_simulator import (BREAKPOINT, BUDGET, CYCLE, ERROR, HALT, READ, TIMEOUT, WATCH_READ, WATCH_WRITE,
+                                      WRITE, MicroSim, decode, disassemble)
 from tests.test_utils import verify_ram_content_helper
-from utils import REGISTER, clear_registers
+from utils import OPCODE_NAMES, RAM, REGISTER, RegisterFile
 
 
 class SimulatorTest(TestCase):
@@ -46,7 +50,7 @@ class SimulatorTest(TestCase):
                 ('cond', '1')
             ]
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
 
     def test_simple_instructions(self):
         instance = MicroSim()
@@ -94,12 +98,12 @@ class SimulatorTest(TestCase):
                 ('cond', '0')
             ]
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
 
         with mock.patch('builtins.input', return_value=return_values[1]):
             instance.is_running = True
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
 
         with mock.patch('builtins.input', return_value=return_values[2]):
             instance.is_running = True
@@ -131,7 +135,7 @@ class SimulatorTest(TestCase):
                 ('cond', '0')
             ]
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
 
         with mock.patch('builtins.input', return_value=return_values[3]):
             instance.is_running = True
@@ -151,7 +155,7 @@ class SimulatorTest(TestCase):
             ]
             self.register_content = [
                 ('r0', '00'),
-                ('r1', '1E'),
+                ('r1', '30'),
                 ('r2', '00'),
                 ('r3', 'F0'),
                 ('r4', 'DF'),
@@ -164,7 +168,7 @@ class SimulatorTest(TestCase):
                 ('cond', '0')
             ]
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
 
     def test_invalid_instruction(self):
         instance = MicroSim()
@@ -181,12 +185,27 @@ class SimulatorTest(TestCase):
         with mock.patch('builtins.input', return_value=return_values[0]):
             with self.assertRaises(TimeoutError) or self.assertRaises(ValueError):
                 verify_ram_content_helper(self, instance)
-            clear_registers()
+            instance.registers.clear()
 
         with mock.patch('builtins.input', return_value=return_values[1]):
             with self.assertRaises(TimeoutError):
                 verify_ram_content_helper(self, instance)
-            clear_registers()
+            instance.registers.clear()
+
+    def test_invalid_obj_file(self):
+        # The low byte of LOADIM R7, #100 does not fit in a byte
+        filename = '../output/sprt5Test3-rey.obj' if sys.platform == 'win32' else 'output/sprt5Test3-rey.obj'
+        instance = MicroSim()
+        with self.assertRaisesRegex(SyntaxError, "line 1: '0F 100'"):
+            instance.read_obj_file(filename)
+        self.assertFalse(instance.is_ram_loaded)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'long.obj')
+            with open(filename, 'w') as file:
+                file.write('00 00\n' * (len(instance.ram) // 2 + 1))
+            with self.assertRaises(MemoryError):
+                instance.read_obj_file(filename)
 
     def test_subroutine_instructions(self):
         instance = MicroSim()
@@ -217,10 +236,331 @@ class SimulatorTest(TestCase):
                 ('cond', '0')
             ]
             verify_ram_content_helper(self, instance)
-            self.verify_register_content()
+            self.verify_register_content(instance)
+
+    def test_register_file(self):
+        registers = RegisterFile()
+        registers.write(1, 0x2A)
+        registers.move_stack_pointer(0xFFE)
+        self.assertEqual('2A', registers['r1'])
+        self.assertEqual('FFE', registers['sp'])
+        self.assertEqual('FE', registers['r7'])
+        registers.write(7, 0x10)
+        self.assertEqual('010', registers['sp'])
+        with self.assertRaises(SystemError):
+            registers.write(0, 1)
+        registers['ir'] = 'a81e'
+        self.assertEqual(0xA81E, registers.ir)
+        registers.clear()
+        self.assertEqual(['00'] * 8 + ['000', '000', '0000', '0'], list(registers.values()))
+
+    def test_decode_table_cache(self):
+        table = microprocessor_simulator.DECODE_TABLE
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, {'SEMREF_CACHE': directory}):
+            try:
+                with mock.patch.object(microprocessor_simulator, 'decode', wraps=decode) as build:
+                    microprocessor_simulator.DECODE_TABLE = None
+                    built = microprocessor_simulator.get_decode_table()
+                    self.assertEqual(65536, build.call_count)
+                    self.assertTrue(os.path.exists(microprocessor_simulator.decode_table_path()))
+                    # Loaded from the file without decoding a word
+                    build.reset_mock()
+                    microprocessor_simulator.DECODE_TABLE = None
+                    loaded = microprocessor_simulator.get_decode_table()
+                    self.assertFalse(build.called)
+            finally:
+                microprocessor_simulator.DECODE_TABLE = table
+        self.assertEqual(built, loaded)
+        self.assertEqual(decode(0xA81E), loaded[0xA81E])
+        self.assertEqual((23, 0, 0, 7, 0x1C), loaded[0xB81C])
+        self.assertEqual('JCONDADDR 1C', disassemble(0xB81C))
+
+    def test_run_blocks(self):
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        for name in ['test.obj', 'test3.obj', 'test5.obj', 'test8.obj', 'test10.obj', 'test11.obj',
+                     'sprt5Test1-A34.obj', 'sprt5Test4-abr.obj']:
+            image = os.path.join(directory, name)
+            self.assertEqual(self.run_program(image, False), self.run_program(image, True), name)
+
+        # STORE R1 rewrites the operand of LOADIM R3 after the block holding it was compiled.
+        program = bytes.fromhex('090A 0A00 1909 E800 0B01 A80A')
+        interpreted = self.run_program(program, False)
+        self.assertEqual(interpreted, self.run_program(program, True))
+        self.assertEqual('0A', interpreted[1]['r3'])
+
+        # LOADIM R1, #00; ADDIM R2, #01; STORE 01, R2; NOP; JMPADDR 00. Chunks cut by the timeout check
+        # end in interpreted instructions, whose stores into compiled code must invalidate it too.
+        program = bytes.fromhex('0900 4A01 1A01 E800 A800')
+        for max_steps in (12295, 16390):
+            results = []
+            for compiled in (False, True):
+                instance = MicroSim()
+                instance.ram[0:len(program)] = program
+                result = instance.run(max_steps, timeout=60, compiled=compiled, detect_cycles=False)
+                results.append((result.reason, result.steps, bytes(instance.ram), dict(instance.registers)))
+            self.assertEqual(results[0], results[1], max_steps)
+
+        # JMPADDR 00 as the first instruction runs twice, the first time with no previous program counter
+        results = []
+        for compiled in (False, True):
+            instance = MicroSim()
+            instance.ram[0:2] = bytes.fromhex('A800')
+            result = instance.run(compiled=compiled)
+            results.append((result.reason, result.steps, instance.counter, instance.prev_program_counter))
+        self.assertEqual([(HALT, 2, 2, 0)] * 2, results)
+
+    def test_run(self):
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        for compiled in (False, True):
+            instance = MicroSim()
+            instance.read_obj_file(os.path.join(directory, 'test5.obj'))
+            result = instance.run(max_steps=1000, compiled=compiled)
+            self.assertEqual((HALT, 8), (result.reason, result.steps))
+            self.assertEqual('A81E', instance.registers['ir'])
+
+            # test9.obj never halts
+            instance.micro_clear()
+            instance.read_obj_file(os.path.join(directory, 'test9.obj'))
+            result = instance.run(max_steps=1000, compiled=compiled, detect_cycles=False)
+            self.assertEqual((BUDGET, 1000), (result.reason, result.steps))
+            result = instance.run(timeout=0.01, check_interval=100, compiled=compiled, detect_cycles=False)
+            self.assertEqual(TIMEOUT, result.reason)
+            self.assertFalse(instance.is_running)
+            result = instance.run(compiled=compiled)
+            self.assertEqual(CYCLE, result.reason)
+            self.assertLess(result.steps, 5000)
+            self.assertEqual(0, result.period % 9)
+
+            # LOADIM R2, #01; LOADIM R0, #01
+            instance.micro_clear()
+            instance.ram[0:4] = bytes.fromhex('0A01 0801')
+            result = instance.run(max_steps=1000, compiled=compiled)
+            self.assertEqual((ERROR, 1), (result.reason, result.steps))
+            self.assertIsInstance(result.error, SystemError)
+
+    def test_instance_state(self):
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        first = MicroSim()
+        second = MicroSim()
+        first.read_obj_file(os.path.join(directory, 'test5.obj'))
+        second.read_obj_file(os.path.join(directory, 'test11.obj'))
+        first.is_running = second.is_running = True
+        while first.is_running or second.is_running:
+            for instance in (first, second):
+                if instance.is_running:
+                    instance.run_micro_instructions()
+        self.assertEqual(self.run_program(os.path.join(directory, 'test5.obj'), False)[:2],
+                         (bytes(first.ram), dict(first.registers)))
+        self.assertEqual(self.run_program(os.path.join(directory, 'test11.obj'), False)[:2],
+                         (bytes(second.ram), dict(second.registers)))
+        self.assertEqual(bytes(len(RAM)), bytes(RAM))
+        self.assertEqual('0000', REGISTER['ir'])
+
+    def test_snapshot(self):
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        instance = MicroSim()
+        instance.read_obj_file(os.path.join(directory, 'test10.obj'))
+        loaded = (bytes(instance.ram), dict(instance.registers), instance.program_counter)
+        instance.run()
+        finished = instance.snapshot()
+        halted = (bytes(instance.ram), dict(instance.registers), instance.program_counter)
+        self.assertNotEqual(loaded, halted)
+
+        instance.reset()
+        self.assertEqual(loaded, (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+        self.assertEqual(-1, instance.prev_program_counter)
+        instance.restore(finished)
+        self.assertEqual(halted, (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+        instance.ports['traffic_light'] = 0x100
+        instance.reset()
+        self.assertEqual(0, instance.ports['traffic_light'])
+
+        # Blocks compiled from other code must not survive a restore. LOADIM R3, #01 / #02; JMPADDR 02
+        instance = MicroSim()
+        instance.ram[0:4] = bytes.fromhex('0B01 A802')
+        image = instance.snapshot()
+        instance.ram[0:4] = bytes.fromhex('0B02 A802')
+        instance.run(compiled=True)
+        self.assertEqual('02', instance.registers['r3'])
+        instance.restore(image)
+        instance.run(compiled=True)
+        self.assertEqual('01', instance.registers['r3'])
+
+    def test_step_back(self):
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        instance = MicroSim()
+        instance.read_obj_file(os.path.join(directory, 'test11.obj'))
+        instance.enable_journal()
+        instance.is_running = True
+        states = []
+        while instance.is_running:
+            states.append((bytes(instance.ram), dict(instance.registers), instance.program_counter))
+            instance.run_micro_instructions()
+        self.assertEqual(len(states), len(instance.journal))
+        self.assertEqual(3, instance.step_back(3))
+        self.assertEqual(states[-3], (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+        self.assertTrue(instance.is_running)
+        instance.run_back_to(states[2][2])
+        self.assertEqual(states[2], (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+        self.assertEqual(2, instance.step_back(5))
+        self.assertEqual(states[0], (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+
+        # Only the last entries are kept
+        instance.enable_journal(size=4)
+        result = instance.run()
+        self.assertEqual(4, instance.step_back(result.steps))
+
+        # Entries of a run left behind by reset or a new load are not replayed
+        for start_over in (instance.reset, lambda: instance.read_obj_file(os.path.join(directory, 'test11.obj'))):
+            instance.run()
+            start_over()
+            loaded = (bytes(instance.ram), dict(instance.registers), instance.program_counter)
+            self.assertEqual(0, instance.step_back())
+            self.assertEqual(loaded, (bytes(instance.ram), dict(instance.registers), instance.program_counter))
+        instance.disable_journal()
+        self.assertNotIn('run_micro_instructions', instance.__dict__)
+
+    def test_profile(self):
+        # LOADIM R1, #03; LOOP R1, 02; JMPADDR 04
+        instance = MicroSim()
+        instance.ram[0:6] = bytes.fromhex('0903 C102 A804')
+        profile = instance.enable_profile()
+        result = instance.run(compiled=True)
+        self.assertEqual(('halt', 5), (result.reason, result.steps))
+        self.assertEqual([1, 3, 1], profile.executions[0:6:2])
+        self.assertEqual((2, 1), (profile.taken[2], profile.not_taken[2]))
+        self.assertEqual(3, profile.opcodes[OPCODE_NAMES.index('loop')])
+        self.assertEqual([(2, 3), (0, 1), (4, 1)], profile.hottest(3))
+
+        report = instance.profile_report({'start': '00000000000', 'done': '00000000100'})
+        self.assertEqual(['5 instructions',
+                          'start: 4 (80.0%)',
+                          '  002           3   60.0%  LOOP R1, 02         taken 2, not taken 1',
+                          '  000           1   20.0%  LOADIM R1, #03',
+                          'done: 1 (20.0%)',
+                          '  004           1   20.0%  JMPADDR 04'], report.splitlines())
+
+        # Profiling leaves the same state as a plain run
+        directory = '../output' if sys.platform == 'win32' else 'output'
+        program = os.path.join(directory, 'test11.obj')
+        expected = self.run_program(program, compiled=False)
+        instance = MicroSim()
+        instance.read_obj_file(program)
+        instance.enable_profile()
+        instance.enable_journal()
+        instance.run()
+        self.assertEqual(expected, (bytes(instance.ram), dict(instance.registers), instance.program_counter,
+                                    instance.is_running))
+        self.assertEqual(len(instance.journal), instance.disable_profile().total())
+        self.assertEqual(instance.run_journaled_instruction, instance.run_micro_instructions)
+
+    def test_breakpoints(self):
+        # LOADIM R1, #05; STORE 20, R1; LOAD R2, 20; JMPADDR 06
+        instance = MicroSim()
+        instance.ram[0:8] = bytes.fromhex('0905 1920 0220 A806')
+        instance.loaded_image = instance.snapshot()
+        instance.set_breakpoint(4)
+        result = instance.run()
+        self.assertEqual((BREAKPOINT, 2, 4, 4), (result.reason, result.steps, result.address,
+                                                 instance.program_counter))
+        self.assertEqual("RunResult(reason='breakpoint', steps=2, address=0x004)", repr(result))
+        result = instance.run()
+        self.assertEqual((HALT, 2), (result.reason, result.steps))
+
+        # A breakpoint on the first instruction stops before it runs, resuming goes past it
+        instance.set_breakpoint(0)
+        instance.reset()
+        result = instance.run()
+        self.assertEqual((BREAKPOINT, 0, 0), (result.reason, result.steps, result.address))
+        self.assertEqual((BREAKPOINT, 4), (instance.run().reason, instance.program_counter))
+        instance.set_breakpoint(0, False)
+
+        # Debug steps onto the breakpoint, then resumes stepping from it
+        instance.reset()
+        instance.resume()
+        instance.run_micro_instructions()
+        instance.run_micro_instructions()
+        self.assertEqual(((BREAKPOINT, 4), False), (instance.stopped_at, instance.is_running))
+        instance.resume()
+        instance.run_micro_instructions()
+        self.assertEqual((None, True, 6), (instance.stopped_at, instance.is_running, instance.program_counter))
+
+        instance.set_breakpoint(4, False)
+        self.assertNotIn('run_micro_instructions', instance.__dict__)
+        for compiled in (False, True):
+            instance.reset()
+            instance.set_watchpoint(0x20, WATCH_WRITE)
+            result = instance.run(compiled=compiled)
+            self.assertEqual((WRITE, 2, 0x20), (result.reason, result.steps, result.address))
+            self.assertEqual('05', f'{instance.ram[0x20]:02X}')
+            instance.set_watchpoint(0x20, WATCH_READ)
+            result = instance.run(compiled=compiled)
+            self.assertEqual((READ, 1, 0x20), (result.reason, result.steps, result.address))
+            self.assertEqual('05', instance.registers['r2'])
+            self.assertEqual(HALT, instance.run(compiled=compiled).reason)
+            instance.clear_breakpoints()
+
+        # Stack accesses. LOADIM R7, #40; PUSH R1; POP R2; JMPADDR 06
+        instance = MicroSim()
+        instance.ram[0:8] = bytes.fromhex('0F40 2100 1200 A806')
+        instance.set_watchpoint(0x3F)
+        self.assertEqual((WRITE, 0x3F), (instance.run().reason, instance.stopped_at[1]))
+        self.assertEqual((READ, 0x3F), (instance.run().reason, instance.stopped_at[1]))
+        # Return address, watched on its second byte only. LOADIM R7, #40; CALL 08; JMPADDR 04; ...; RETURN
+        instance = MicroSim()
+        instance.ram[0:10] = bytes.fromhex('0F40 F008 A804 0000 F800')
+        instance.set_watchpoint(0x3F)
+        result = instance.run()
+        self.assertEqual((WRITE, 0x3F), (result.reason, result.address))
+        result = instance.run()
+        self.assertEqual((READ, 0x3F), (result.reason, result.address))
+        self.assertEqual(HALT, instance.run().reason)
+        with self.assertRaises(ValueError):
+            instance.set_breakpoint(4096)
+
+    def test_dirty(self):
+        # LOADIM R1, #41; STORE 20, R1; LOADIM R7, #22; PUSH R1; CALL 0E; ...; JMPADDR 0E
+        program = bytes.fromhex('0941 1920 0F22 2100 F00E 0000 0000 A80E')
+        for compiled in (False, True):
+            instance = MicroSim()
+            instance.ram[:len(program)] = program
+            instance.run(compiled=compiled)
+            self.assertEqual([0x1F, 0x20, 0x21], instance.take_dirty())
+            self.assertEqual([], instance.take_dirty())
+
+        instance.enable_journal()
+        instance.reset()
+        instance.ram[:len(program)] = program
+        instance.run()
+        instance.take_dirty()
+        instance.step_back(2)
+        self.assertEqual([0x1F, 0x20], instance.take_dirty())
+
+    def run_program(self, program, compiled, max_steps=20000):
+        """
+        Runs an .obj file or a memory image and returns the resulting machine state
+        :param program: str filename or bytes image
+        :param compiled: bool run through compiled blocks instead of the interpreter
+        :param max_steps: int
+        :return: tuple
+        """
+        instance = MicroSim()
+        if isinstance(program, str):
+            instance.read_obj_file(program)
+        else:
+            instance.ram[:len(program)] = program
+        instance.is_running = True
+        if compiled:
+            instance.run_blocks(max_steps)
+        else:
+            for _ in range(max_steps):
+                if not instance.is_running:
+                    break
+                instance.run_micro_instructions()
+        return bytes(instance.ram), dict(instance.registers), instance.program_counter, instance.is_running
 
-    def verify_register_content(self):
+    def verify_register_content(self, instance):
         for register in self.register_content:
-            self.assertEqual(register[1], REGISTER[register[0]],
+            self.assertEqual(register[1], instance.registers[register[0]],
                              f'{register[0].upper()} has an incorrect value')
-        clear_registers()
+        instance.registers.clear()
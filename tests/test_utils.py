@@ -1,8 +1,6 @@
-import time
-
-from assembler import Assembler, verify_ram_content, hexify_ram_content
-from microprocessor_simulator import RAM
-from utils import clear_ram
+from assembler import Assembler
+from microprocessor_simulator import CYCLE, TIMEOUT
+from utils import HexView
 
 
 def assert_ram_content(tester, content, RAM):
@@ -21,21 +19,23 @@ def verify_ram_content_helper(tester, instance):
     Helper to test different input files and verify expected outputs vs actual outputs
     """
     filename = input()
-    clear_ram()
     if isinstance(instance, Assembler):
+        instance.ram[:] = bytes(len(instance.ram))
         instance.micro_instr.clear()
         instance.read_source(filename)
         instance.store_instructions_in_ram()
 
-        verify_ram_content()
-        hexify_ram_content()
-        assert_ram_content(tester, tester.hex_content, RAM)
+        instance.verify_ram_content()
+        instance.hexify_ram_content()
+        assert_ram_content(tester, tester.hex_content, HexView(instance.ram))
     else:
+        instance.micro_clear()
         instance.read_obj_file(filename)
-        instance.is_running = True
-        timeout = time.time() + 5
-        while instance.is_running:
-            instance.run_micro_instructions(timeout)
-        assert_ram_content(tester, tester.ram_content, RAM)
+        result = instance.run(timeout=5)
+        if result.error:
+            raise result.error
+        if result.reason in (CYCLE, TIMEOUT):
+            raise TimeoutError('Infinite loop detected.')
+        assert_ram_content(tester, tester.ram_content, HexView(instance.ram))
         instance.program_counter = 0
         instance.prev_program_counter = -1
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+from unittest import TestCase
+
+import mock
+
+from microprocessor_simulator import BREAKPOINT, CYCLE, ERROR, HALT, STOPPED, MicroSim
+from worker import MIN_FRAME_BUDGET, FrameRunner, SimulationWorker
+
+
+class SimulationWorkerTest(TestCase):
+    directory = '../output' if sys.platform == 'win32' else 'output'
+
+    def test_run(self):
+        expected = MicroSim()
+        expected.read_obj_file(os.path.join(self.directory, 'test11.obj'))
+        result = expected.run()
+
+        instance = MicroSim()
+        instance.read_obj_file(os.path.join(self.directory, 'test11.obj'))
+        worker = SimulationWorker(instance)
+        worker.start()
+        self.assertEqual((HALT, result.steps), (worker.join(5).reason, worker.result.steps))
+        self.assertEqual((bytes(expected.ram), dict(expected.registers)), (bytes(instance.ram), dict(instance.registers)))
+
+        # Frames not taken are merged into the last one
+        frame = worker.take_frame()
+        self.assertEqual(worker.result, frame.result)
+        self.assertEqual(dict(instance.registers), frame.registers)
+        self.assertEqual(expected.take_dirty(), frame.dirty)
+        self.assertEqual((instance.program_counter, instance.ram[instance.program_counter] << 8 |
+                          instance.ram[instance.program_counter + 1]), frame.rows[-1])
+        self.assertIsNone(worker.take_frame())
+
+    def test_stop(self):
+        # ADDIM R1, #01; JMPADDR 00
+        instance = MicroSim()
+        instance.ram[0:4] = bytes.fromhex('4901 A800')
+        worker = SimulationWorker(instance, history_size=10, detect_cycles=False)
+        worker.start()
+        time.sleep(0.05)
+        self.assertTrue(worker.is_alive())
+        worker.stop()
+        result = worker.join(5)
+        self.assertEqual(STOPPED, result.reason)
+        self.assertFalse(instance.is_running)
+        self.assertEqual(result.steps, instance.counter)
+        self.assertEqual(10, len(worker.take_frame().rows))
+
+        worker = SimulationWorker(instance)
+        worker.start()
+        self.assertEqual(CYCLE, worker.join(5).reason)
+
+    def test_error(self):
+        # Any exception from an instruction ends the run with ERROR rather than as a halt
+        instance = MicroSim()
+        instance.run_micro_instructions = mock.Mock(side_effect=KeyError('word'))
+        worker = SimulationWorker(instance)
+        worker.start()
+        result = worker.join(5)
+        self.assertEqual(ERROR, result.reason)
+        self.assertIsInstance(result.error, KeyError)
+        self.assertEqual(result, worker.take_frame().result)
+
+    def test_resume_after_breakpoint(self):
+        # LOADIM R1, #05; STORE 20, R1; LOAD R2, 20; JMPADDR 06
+        for worker_class in (SimulationWorker, FrameRunner):
+            instance = MicroSim()
+            instance.ram[0:8] = bytes.fromhex('0905 1920 0220 A806')
+            instance.set_breakpoint(0)
+            instance.set_breakpoint(4)
+            results = []
+            for _ in range(3):
+                worker = worker_class(instance, detect_cycles=False)
+                worker.start()
+                while worker.is_alive():
+                    worker.run_frame(1 / 60)
+                result = worker.join(5)
+                results.append((result.reason, result.steps, result.address))
+            # Stops before the first instruction, then continues from each breakpoint without starting over
+            self.assertEqual([(BREAKPOINT, 0, 0), (BREAKPOINT, 2, 4), (HALT, 2, None)], results)
+            self.assertEqual('05', instance.registers['r2'])
+
+    def test_clock_rate(self):
+        with self.assertRaises(ValueError):
+            SimulationWorker(MicroSim(), rate=0)
+
+        # ADDIM R1, #01; JMPADDR 00
+        instance = MicroSim()
+        instance.ram[0:4] = bytes.fromhex('4901 A800')
+        worker = SimulationWorker(instance, detect_cycles=False, rate=200)
+        worker.start()
+        time.sleep(0.5)
+        worker.stop()
+        result = worker.join(5)
+        elapsed = time.perf_counter() - worker.started
+        self.assertEqual(STOPPED, result.reason)
+        # Never ahead of the clock, and not far behind it
+        self.assertLessEqual(result.steps, 200 * elapsed + 1)
+        self.assertGreaterEqual(result.steps, 50)
+        self.assertAlmostEqual(200, worker.take_frame().rate, delta=100)
+
+    def test_frame_runner(self):
+        expected = MicroSim()
+        expected.read_obj_file(os.path.join(self.directory, 'test11.obj'))
+        result = expected.run()
+
+        instance = MicroSim()
+        instance.read_obj_file(os.path.join(self.directory, 'test11.obj'))
+        runner = FrameRunner(instance)
+        runner.start()
+        while runner.is_alive():
+            runner.run_frame(1 / 60)
+        self.assertEqual((HALT, result.steps), (runner.join().reason, runner.result.steps))
+        self.assertEqual((bytes(expected.ram), dict(expected.registers)), (bytes(instance.ram), dict(instance.registers)))
+        self.assertEqual(runner.result, runner.take_frame().result)
+
+        # The budget follows the time the UI leaves in each frame
+        runner = FrameRunner(MicroSim(), budget=0.012)
+        runner.spent = 0.012
+        for _ in range(50):
+            runner.adjust_budget(0.012 + 0.008)
+        self.assertAlmostEqual(1 / 60 - 0.008, runner.budget)
+        for _ in range(50):
+            runner.adjust_budget(0.012 + 0.1)
+        self.assertAlmostEqual(MIN_FRAME_BUDGET, runner.budget)
+
+        # ADDIM R1, #01; JMPADDR 00
+        instance = MicroSim()
+        instance.ram[0:4] = bytes.fromhex('4901 A800')
+        runner = FrameRunner(instance, budget=0.005, detect_cycles=False)
+        runner.start()
+        runner.run_frame(0)
+        self.assertTrue(runner.is_alive())
+        self.assertGreater(runner.take_frame().steps, 0)
+        runner.stop()
+        runner.run_frame(1 / 60)
+        self.assertEqual(STOPPED, runner.join().reason)
+        self.assertFalse(runner.is_alive())
+
+        instance = MicroSim()
+        instance.run_micro_instructions = mock.Mock(side_effect=KeyError('word'))
+        runner = FrameRunner(instance)
+        runner.start()
+        runner.run_frame(1 / 60)
+        self.assertEqual(ERROR, runner.join().reason)
+        self.assertIsInstance(runner.result.error, KeyError)
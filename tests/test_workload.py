@@ -0,0 +1,53 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from assembler import compare_indentation_between_lines, verify_indentation
+from batch import run_program
+from benchmarks.workload import generate
+
+
+class WorkloadTest(TestCase):
+
+    def run_source(self, source, **kwargs):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'workload.asm')
+            with open(filename, 'w') as file:
+                file.write(source)
+            return run_program(filename, **kwargs)
+
+    def test_generate(self):
+        source = generate(seed=1)
+        self.assertEqual(source, generate(seed=1))
+        self.assertNotEqual(source, generate(seed=2))
+
+        lines = source.splitlines()
+        file = io.StringIO(source)
+        for index, line in enumerate(lines):
+            verify_indentation(line, index, file)
+            if index + 1 < len(lines):
+                compare_indentation_between_lines(line, lines[index + 1], index, file)
+
+        result = self.run_source(source)
+        self.assertEqual('halt', result['status'])
+        compiled = self.run_source(source, compiled=True)
+        self.assertEqual((result['steps'], result['ram_sha256']), (compiled['steps'], compiled['ram_sha256']))
+
+    def test_shape(self):
+        source = generate(seed=0, labels=300, call_depth=100, kernels=2, loop_depth=4, loop_count=3,
+                          data_bytes=1792, max_db_length=1, segments=20)
+        self.assertEqual(300, source.count(':\n    ', source.index('blk0:')))
+        self.assertEqual(1792, source.count(' db ') - 32)
+        self.assertEqual(1 + 1 + 20 + 1, source.count('org '))
+        result = self.run_source(source)
+        self.assertEqual('halt', result['status'])
+        # Each kernel's innermost body runs loop_count ** loop_depth times
+        self.assertGreater(result['steps'], 2 * 3 ** 4)
+
+        with self.assertRaises(ValueError):
+            generate(labels=1000)
+        with self.assertRaises(ValueError):
+            generate(call_depth=1000)
+        with self.assertRaises(ValueError):
+            generate(data_bytes=4096)
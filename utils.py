@@ -1,4 +1,5 @@
 import re
+from collections.abc import Mapping
 
 
 def convert_to_hex(num, bits):
@@ -93,28 +94,27 @@ def clear_registers():
     """
     Sets register values to 0
     """
-    value = '00'
-    for key in REGISTER:
-        if key == 'cond':
-            value = '0'
-        elif key in ('pc', 'sp'):
-            value = '000'
-        elif key == 'ir':
-            value = '0000'
-        REGISTER[key] = value
-
-
-def load_ram(data):
+    REGISTER.clear()
+
+
+def load_ram(data, ram=None):
     """
     Loads data into RAM
-    :param data: list
+    :param data: list of lines, each one a word as two hex bytes
+    :param ram: bytearray to load into, defaults to RAM
     """
+    if ram is None:
+        ram = RAM
     i = 0
-    for item in data:
-        item.strip()
+    for line, item in enumerate(data, 1):
         hex_instruction = ''.join(item.split())
-        RAM[i] = hex_instruction[0:2]
-        RAM[i + 1] = hex_instruction[2:]
+        if re.fullmatch(r'[0-9a-fA-F]{4}', hex_instruction) is None:
+            raise SyntaxError(f"Invalid object code on line {line}: '{item.strip()}'. "
+                              f"Each line must be a word of two hex bytes")
+        if i + 1 >= len(ram):
+            raise MemoryError('Exceeded Memory Size')
+        ram[i] = int(hex_instruction[0:2], 16)
+        ram[i + 1] = int(hex_instruction[2:], 16)
         i += 2
 
 
@@ -126,33 +126,50 @@ def is_valid_file(filename):
     return re.match(r'^.+\.?(obj|asm)$', filename) is not None, filename[-3:]
 
 
-def traffic_lights_binary():
+def device_ports():
     """
-    Gets traffic lights binary representation from RAM
-    :return: str
+    Gets the current port of each I/O device
+    :return: dict device name -> port as an int
     """
-    return hex_to_binary(f'{RAM[int(TRAFFIC_LIGHT["port"], 16)]}')
-
-
-def seven_segment_binary():
-    """
-    Gets seven segment display binary representation from RAM
-    :return: str
-    """
-    return hex_to_binary(f'{RAM[int(SEVEN_SEGMENT_DISPLAY["port"], 16)]}')
+    return {
+        'traffic_light': int(TRAFFIC_LIGHT['port'], 16),
+        'seven_segment_display': int(SEVEN_SEGMENT_DISPLAY['port'], 16),
+        'hex_keyboard': int(HEX_KEYBOARD['port'], 16),
+        'ascii_table': int(ASCII_TABLE['port'], 16)
+    }
 
 
 def clear_ram():
     """
     Sets ram values to 0
     """
-    i = 0
-    while i < len(RAM):
-        RAM[i] = '00'
-        i += 1
+    RAM[:] = bytes(len(RAM))
+
+
+class HexView:
+    """Read-only view that renders a byte buffer as two digit hexadecimal strings"""
+    __slots__ = ('buffer',)
 
+    def __init__(self, buffer):
+        self.buffer = buffer
 
-RAM = ['00' for i in range(4096)]
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [f'{byte:02X}' for byte in self.buffer[index]]
+        return f'{self.buffer[index]:02X}'
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __iter__(self):
+        return (f'{byte:02X}' for byte in self.buffer)
+
+
+# Main memory. Every cell holds an int in [0, 255]; use RAM_HEX for its text form.
+# Memory shared with the GUI. MicroSim and Assembler objects created without a ram use their own.
+RAM_SIZE = 4096
+RAM = bytearray(RAM_SIZE)
+RAM_HEX = HexView(RAM)
 
 # OPCODE initialization list.
 OPCODE = {
@@ -189,21 +206,102 @@ OPCODE = {
     'call': f'{30:05b}',
     'return': f'{31:05b}'
 }
-# Registers initialization.
-REGISTER = {
-    'r0': f'{0:02x}',
-    'r1': f'{0:02x}',
-    'r2': f'{0:02x}',
-    'r3': f'{0:02x}',
-    'r4': f'{0:02x}',
-    'r5': f'{0:02x}',
-    'r6': f'{0:02x}',
-    'r7': f'{0:02x}',
-    'pc': f'{0:03x}',
-    'sp': f'{0:03x}',
-    'ir': f'{0:04x}',
-    'cond': f'{0:01x}'
-}
+
+# Opcode number -> instruction name.
+OPCODE_NAMES = [None] * len(OPCODE)
+for _name, _code in OPCODE.items():
+    OPCODE_NAMES[int(_code, 2)] = _name
+
+
+class RegisterFile(Mapping):
+    """
+    Microprocessor registers stored as ints.
+    R0-R7 are 8 bits wide, PC and SP 12 bits, IR 16 bits and COND 1 bit.
+    R7 holds the low byte of the stack pointer, so writing R7 moves SP.
+    Indexing by name renders a register as hexadecimal text, like the old REGISTER dict.
+    """
+    __slots__ = ('gpr', 'pc', 'sp', 'ir', 'cond')
+
+    # Register name -> number of hexadecimal digits used to render it.
+    DIGITS = {
+        'r0': 2,
+        'r1': 2,
+        'r2': 2,
+        'r3': 2,
+        'r4': 2,
+        'r5': 2,
+        'r6': 2,
+        'r7': 2,
+        'pc': 3,
+        'sp': 3,
+        'ir': 4,
+        'cond': 1
+    }
+
+    def __init__(self):
+        self.gpr = [0] * 8
+        self.clear()
+
+    def clear(self):
+        """
+        Sets register values to 0
+        """
+        self.gpr[:] = [0] * 8
+        self.pc = 0
+        self.sp = 0
+        self.ir = 0
+        self.cond = 0
+
+    def write(self, index, value):
+        """
+        Writes an 8-bit value to a general purpose register
+        :param index: int
+        :param value: int
+        """
+        if index == 7:
+            self.sp = value
+        elif not index and value:
+            raise SystemError('R0 cannot be modified')
+        self.gpr[index] = value
+
+    def move_stack_pointer(self, value):
+        """
+        Sets the 12-bit stack pointer and mirrors its low byte in R7
+        :param value: int
+        """
+        self.sp = value
+        self.gpr[7] = value & 0xFF
+
+    def value(self, name):
+        """
+        Gets a register value by name
+        :param name: str
+        :return: int
+        """
+        if name[0] == 'r':
+            return self.gpr[int(name[1])]
+        return getattr(self, name)
+
+    def __getitem__(self, name):
+        digits = self.DIGITS[name]
+        return f'{self.value(name) & ((1 << digits * 4) - 1):0{digits}X}'
+
+    def __setitem__(self, name, text):
+        value = int(text, 16) & ((1 << self.DIGITS[name] * 4) - 1)
+        if name[0] == 'r':
+            self.write(int(name[1]), value)
+        else:
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return iter(self.DIGITS)
+
+    def __len__(self):
+        return len(self.DIGITS)
+
+
+# Registers shared with the GUI. MicroSim objects created without registers use their own.
+REGISTER = RegisterFile()
 # Format 1 of the different OPCODE.
 FORMAT_1_OPCODE = [
     'loadrind',
@@ -0,0 +1,323 @@
+import threading
+import time
+from collections import deque
+
+from microprocessor_simulator import (CYCLE, CYCLE_CHECK_INTERVAL, ERROR, HALT, STOPPED, CycleDetector,
+                                      RunResult)
+
+# Clock rates accepted by SimulationWorker, in instructions per second
+MIN_CLOCK_RATE = 1
+MAX_CLOCK_RATE = 1000000
+# Most seconds of instructions a paced worker catches up on after falling behind. A longer delay
+# is dropped rather than run as a burst, so a slow host shows a lower achieved rate.
+MAX_CLOCK_LAG = 0.1
+# Least seconds of a frame FrameRunner spends running instructions, however slow the UI is
+MIN_FRAME_BUDGET = 0.002
+
+
+class Frame:
+    """State of a MicroSim published by SimulationWorker for a UI to paint"""
+    __slots__ = ('registers', 'ram', 'dirty', 'rows', 'steps', 'rate', 'result')
+
+    def __init__(self, registers, ram, dirty, rows, steps, rate, result):
+        """
+        :param registers: dict register name -> hexadecimal text
+        :param ram: bytes
+        :param dirty: list of int addresses written since the previous frame
+        :param rows: list of (address, word) of the instructions reached since the previous frame, the
+        most recent ones if there were more than the worker keeps
+        :param steps: int instructions executed since the worker started
+        :param rate: float instructions per second achieved since the worker started
+        :param result: RunResult once the worker finished, otherwise None
+        """
+        self.registers = registers
+        self.ram = ram
+        self.dirty = dirty
+        self.rows = rows
+        self.steps = steps
+        self.rate = rate
+        self.result = result
+
+
+class SimulationWorker:
+    """
+    Runs a MicroSim on a background thread so a UI stays responsive, publishing a Frame at most every
+    interval seconds and once it finishes. The UI takes frames with take_frame at its own pace; frames it
+    did not take are merged into the next one. The MicroSim must not be used by other threads until
+    the worker finishes.
+
+    Given a clock rate, instructions are run in small batches timed against the start of the run, so
+    time lost sleeping or waiting for the UI is caught up and the program keeps its real timing.
+    """
+
+    def __init__(self, micro_sim, interval=1 / 60, history_size=1000, detect_cycles=True, rate=None):
+        """
+        :param micro_sim: MicroSim ready to run
+        :param interval: float seconds between two frames
+        :param history_size: int most instruction rows kept per frame
+        :param detect_cycles: bool stop on a repeated machine state, see CycleDetector
+        :param rate: int instructions per second to emulate, None to run as fast as possible
+        """
+        if rate is not None and not MIN_CLOCK_RATE <= rate <= MAX_CLOCK_RATE:
+            raise ValueError(f'Clock rate must be between {MIN_CLOCK_RATE} and {MAX_CLOCK_RATE} Hz')
+        self.micro_sim = micro_sim
+        self.interval = interval
+        self.history_size = history_size
+        self.detect_cycles = detect_cycles
+        self.rate = rate
+        self.started = None
+        self.epoch = None  # Time from which a paced worker counts the instructions due
+        self.epoch_steps = 0  # Instructions executed at epoch
+        self.rows = deque(maxlen=history_size)
+        self.steps = 0
+        self.result = None
+        self.frame = None
+        self.frame_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='semref-simulator', daemon=True)
+
+    def start(self):
+        """
+        Starts running the simulator
+        """
+        self.micro_sim.resume()
+        self.started = self.epoch = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        """
+        Asks the worker to stop. It finishes within one check interval and publishes a STOPPED result.
+        """
+        self.stop_event.set()
+
+    def is_alive(self):
+        """
+        :return: bool
+        """
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        """
+        Waits for the worker to finish
+        :param timeout: float seconds
+        :return: RunResult or None if still running
+        """
+        self.thread.join(timeout)
+        return self.result
+
+    def achieved_rate(self):
+        """
+        :return: float instructions per second executed since the worker started
+        """
+        elapsed = time.perf_counter() - self.started
+        return self.steps / elapsed if elapsed > 0 else 0.0
+
+    def take_frame(self):
+        """
+        Takes the latest frame published
+        :return: Frame or None if nothing was published since the last call
+        """
+        with self.frame_lock:
+            frame, self.frame = self.frame, None
+        return frame
+
+    def publish(self):
+        """
+        Publishes the current state, merging the frame the UI has not taken yet
+        """
+        micro_sim = self.micro_sim
+        rows, self.rows = list(self.rows), deque(maxlen=self.history_size)
+        frame = Frame(dict(micro_sim.registers), bytes(micro_sim.ram), micro_sim.take_dirty(), rows,
+                      self.steps, self.achieved_rate(), self.result)
+        with self.frame_lock:
+            previous = self.frame
+            if previous is not None:
+                frame.dirty = sorted(set(previous.dirty).union(frame.dirty))
+                frame.rows = (previous.rows + rows)[-self.history_size:]
+            self.frame = frame
+
+    def pace(self, steps):
+        """
+        Finds how many instructions are due at the clock rate, waiting for a batch of about a millisecond
+        to be due if none is
+        :param steps: int instructions executed since the worker started
+        :return: int instructions to execute now, at most CYCLE_CHECK_INTERVAL
+        """
+        rate = self.rate
+        batch = min(CYCLE_CHECK_INTERVAL, max(1, rate // 1000))
+        elapsed = time.perf_counter() - self.epoch
+        due = int(elapsed * rate) - (steps - self.epoch_steps)
+        if due > rate * MAX_CLOCK_LAG + batch:
+            # The host cannot keep up, start counting again from now
+            self.epoch += elapsed
+            self.epoch_steps = steps
+            return 0
+        if due >= batch:
+            return min(due, CYCLE_CHECK_INTERVAL)
+        self.stop_event.wait(min((steps - self.epoch_steps + batch) / rate - elapsed, self.interval))
+        return 0
+
+    def execute(self, count, detector):
+        """
+        Runs up to count instructions, recording the instruction reached after each one as the debug mode
+        shows them, and stops with a CYCLE result if the detector finds a loop
+        :param count: int
+        :param detector: CycleDetector or None
+        """
+        micro_sim = self.micro_sim
+        ram = micro_sim.ram
+        append = self.rows.append
+        steps = 0
+        try:
+            while micro_sim.is_running and steps < count:
+                micro_sim.run_micro_instructions()
+                steps += 1
+                program_counter = micro_sim.program_counter
+                if program_counter + 1 < len(ram):
+                    word = ram[program_counter] << 8 | ram[program_counter + 1]
+                    if word:
+                        append((program_counter, word))
+        finally:
+            micro_sim.counter += steps
+            self.steps += steps
+        if detector is not None and micro_sim.is_running and detector.check(micro_sim.counter):
+            micro_sim.is_running = False
+            self.result = RunResult(CYCLE, self.steps, period=detector.period)
+
+    def check_stop(self):
+        """
+        Stops with a STOPPED result if stop was called
+        :return: bool True if stopped
+        """
+        if self.stop_event.is_set():
+            self.micro_sim.is_running = False
+            self.result = RunResult(STOPPED, self.steps)
+            return True
+        return False
+
+    def finish(self, error=None):
+        """
+        Sets the result once the simulator stopped running, and publishes the last frame
+        :param error: Exception raised by an instruction, if any
+        """
+        micro_sim = self.micro_sim
+        micro_sim.is_running = False
+        if error is not None:
+            self.result = RunResult(ERROR, self.steps, error)
+        elif self.result is None:
+            stopped_at = micro_sim.stopped_at
+            self.result = (RunResult(stopped_at[0], self.steps, address=stopped_at[1]) if stopped_at
+                           else RunResult(HALT, self.steps))
+        self.publish()
+
+    def run_frame(self, dt):
+        """
+        Called by the UI before taking each frame. The thread runs on its own, see FrameRunner for a worker
+        that needs it.
+        :param dt: float seconds since the previous call
+        """
+
+    def run(self):
+        """
+        Runs instructions until the program halts, fails, loops forever, reaches a breakpoint or is stopped
+        """
+        micro_sim = self.micro_sim
+        rate = self.rate
+        detector = CycleDetector(micro_sim) if self.detect_cycles else None
+        next_frame = time.perf_counter() + self.interval
+        error = None
+        try:
+            while micro_sim.is_running and not self.check_stop():
+                count = CYCLE_CHECK_INTERVAL if rate is None else self.pace(self.steps)
+                if count:
+                    self.execute(count, detector)
+                if time.perf_counter() >= next_frame:
+                    self.publish()
+                    next_frame = time.perf_counter() + self.interval
+        except Exception as e:
+            # Any failure ends the run with ERROR, not as a halt
+            error = e
+        finally:
+            self.finish(error)
+
+
+class FrameRunner(SimulationWorker):
+    """
+    Runs a MicroSim on the UI thread a frame at a time, for the most speed the host can sustain while
+    the UI keeps its frame rate. Each run_frame call executes instructions for a time budget, then
+    publishes a frame for the UI to paint. The budget is adjusted from the time between calls, so it
+    takes whatever the UI leaves of each frame.
+    """
+
+    def __init__(self, micro_sim, frame_time=1 / 60, budget=0.012, history_size=1000, detect_cycles=True):
+        """
+        :param micro_sim: MicroSim ready to run
+        :param frame_time: float seconds per frame the UI aims for
+        :param budget: float seconds of the first frame spent running instructions
+        :param history_size: int most instruction rows kept per frame
+        :param detect_cycles: bool stop on a repeated machine state, see CycleDetector
+        """
+        super().__init__(micro_sim, interval=frame_time, history_size=history_size, detect_cycles=detect_cycles)
+        self.frame_time = frame_time
+        self.budget = budget
+        self.spent = None  # Seconds the previous run_frame took
+        self.detector = None
+
+    def start(self):
+        """
+        Gets the simulator ready, instructions run on the run_frame calls
+        """
+        self.micro_sim.resume()
+        self.started = time.perf_counter()
+        self.detector = CycleDetector(self.micro_sim) if self.detect_cycles else None
+
+    def is_alive(self):
+        """
+        :return: bool
+        """
+        return self.started is not None and self.result is None
+
+    def join(self, timeout=None):
+        """
+        :param timeout: float seconds, unused since instructions only run on run_frame calls
+        :return: RunResult or None if still running
+        """
+        return self.result
+
+    def adjust_budget(self, dt):
+        """
+        Leaves the simulator the part of a frame the UI did not use in the previous one. Moves a quarter
+        of the way at a time so a single slow frame does not starve the next ones.
+        :param dt: float seconds since the previous run_frame call
+        """
+        if self.spent is None or not dt:
+            return
+        other = max(0.0, dt - self.spent)  # Painting and event handling
+        target = min(max(self.frame_time - other, MIN_FRAME_BUDGET), self.frame_time)
+        self.budget += (target - self.budget) / 4
+
+    def run_frame(self, dt):
+        """
+        Runs instructions for the budget and publishes a frame
+        :param dt: float seconds since the previous call
+        """
+        if not self.is_alive():
+            return
+        self.adjust_budget(dt)
+        micro_sim = self.micro_sim
+        start = time.perf_counter()
+        deadline = start + self.budget
+        error = None
+        try:
+            while micro_sim.is_running and not self.check_stop():
+                self.execute(CYCLE_CHECK_INTERVAL, self.detector)
+                if time.perf_counter() >= deadline:
+                    break
+        except Exception as e:
+            # Raised in a Clock callback, it would close the app rather than end the run
+            error = e
+        if error is None and micro_sim.is_running:
+            self.publish()
+        else:
+            self.finish(error)
+        self.spent = time.perf_counter() - start